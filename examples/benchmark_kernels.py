@@ -0,0 +1,41 @@
+"""Per-step cost of a TD brain with the compiled kernels (if Numba is installed) and with the NumPy fallback.
+Run with: python examples/benchmark_kernels.py"""
+import random
+import timeit
+
+from gym.spaces import Discrete
+
+from rltg.agents.brains import kernels
+from rltg.agents.brains.TDBrain import Sarsa, QLearning
+
+N_STATES = 100000
+N_ACTIONS = 3
+N_STEPS = 20000
+
+
+def run(brain_class):
+    brain = brain_class(Discrete(N_STATES), Discrete(N_ACTIONS), alpha=None, gamma=0.99, nsteps=200)
+    state = 0
+    for _ in range(N_STEPS):
+        action = brain.choose_action(state)
+        state2 = random.randrange(N_STATES)
+        brain.observe(state, action, random.random(), state2)
+        brain.learn()
+        brain.update()
+        state = state2
+    brain.reset()
+
+
+if __name__ == '__main__':
+    for brain_class in (Sarsa, QLearning):
+        results = {}
+        for jit in (False, True):
+            kernels.enable_jit(jit)
+            # warm up (compilation)
+            run(brain_class)
+            results[kernels.JIT_ENABLED] = min(timeit.repeat(lambda: run(brain_class), number=1, repeat=3)) / N_STEPS
+        print("{:10s} numpy: {:6.2f} us/step".format(brain_class.__name__, results[False] * 1e6), end="")
+        if True in results:
+            print(", numba: {:6.2f} us/step, speedup: {:.2f}x".format(results[True] * 1e6, results[False] / results[True]))
+        else:
+            print(" (Numba not available)")
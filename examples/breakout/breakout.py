@@ -8,6 +8,7 @@ from gym.spaces import Dict, Discrete, Box, Tuple
 from rltg.agents.RLAgent import RLAgent
 from rltg.agents.TGAgent import TGAgent
 from rltg.agents.brains.TDBrain import Sarsa
+from rltg.agents.brains.qtables.HashQTable import HashQTable
 from rltg.agents.exploration_policies.RandomPolicy import RandomPolicy
 from rltg.agents.feature_extraction import FeatureExtractor, RobotFeatureExtractor
 from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
@@ -92,18 +93,15 @@ class BreakoutRowBottomUpTemporalEvaluator(TemporalEvaluator):
         f = parser("<(!r0 & !r1 & !r2)*;(r0 & !r1 & !r2)*;(r0 & r1 & !r2)*; r0 & r1 & r2>tt")
         reward = 10000
 
-        super().__init__(BreakoutRowBottomUpGoalFeatureExtractor(), set(rows), f, reward, on_the_fly=on_the_fly)
+        super().__init__(BreakoutRowBottomUpGoalFeatureExtractor(), rows, f, reward, on_the_fly=on_the_fly)
+        # the bit of the symbol of each row of the matrix (from the bottom)
+        self.row_bits = np.array([self.symbol2bit[sym] for sym in reversed(self.row_symbols)])
 
-    def fromFeaturesToPropositional(self, features):
-        """map the matrix bricks status to a propositional formula"""
+    def fromFeaturesToBitmask(self, features):
+        """map the matrix bricks status to the bitmask of the symbols of the empty rows"""
         matrix = features
         row_status = np.all(matrix == 0.0, axis=1)
-        result = set()
-        for rs, sym in zip(row_status, reversed(self.row_symbols)):
-            if rs:
-                result.add(sym)
-
-        return frozenset(result)
+        return int(row_status.dot(self.row_bits))
 
 
 def normal_goal():
@@ -135,7 +133,8 @@ def temporal_goal():
 
     agent = TGAgent(BreakoutRobotFeatureExtractor(),
                     RandomPolicy(env.action_space, epsilon_start=1.0, epsilon_end=0.01, decaying_steps=7500000),
-                    Sarsa(None, env.action_space, alpha=None, gamma=0.99, nsteps=200),
+                    Sarsa(None, env.action_space, alpha=None, gamma=0.99, nsteps=200,
+                          q_table=HashQTable(env.action_space.n)),
                     [BreakoutRowBottomUpTemporalEvaluator()])
 
     return env, agent
@@ -40,6 +40,7 @@ from gym.spaces import Box, Tuple
 from rltg.agents.RLAgent import RLAgent
 from rltg.agents.TGAgent import TGAgent
 from rltg.agents.brains.TDBrain import QLearning, Sarsa
+from rltg.agents.brains.qtables.HashQTable import HashQTable
 from rltg.agents.exploration_policies.RandomPolicy import RandomPolicy
 from rltg.agents.feature_extraction import FeatureExtractor, RobotFeatureExtractor
 from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
@@ -103,27 +104,23 @@ class BreakoutCompleteLinesTemporalEvaluator(TemporalEvaluator):
         reward = 10000
 
         super().__init__(BreakoutGoalFeatureExtractor(input_space, bricks_cols=bricks_cols, bricks_rows=bricks_rows),
-                         set(lines),
+                         lines,
                          f,
                          reward,
                          gamma=gamma,
                          on_the_fly=on_the_fly)
+        self.line_bits = np.array([self.symbol2bit[sym] for sym in self.line_symbols])
 
     @abstractmethod
-    def fromFeaturesToPropositional(self, features, **kwargs):
-        """map the matrix bricks status to a propositional formula
+    def fromFeaturesToBitmask(self, features, **kwargs):
+        """map the matrix bricks status to the bitmask of the symbols of the completed lines
         first dimension: columns
         second dimension: row
         """
         matrix = features
         lines_status = np.all(matrix == 0.0, axis=kwargs["axis"])
-        result = set()
-        sorted_symbols = reversed(self.line_symbols) if kwargs["is_reversed"] else self.line_symbols
-        for rs, sym in zip(lines_status, sorted_symbols):
-            if rs:
-                result.add(sym)
-
-        return frozenset(result)
+        line_bits = self.line_bits[::-1] if kwargs["is_reversed"] else self.line_bits
+        return int(lines_status.dot(line_bits))
 
 
 class BreakoutCompleteRowsTemporalEvaluator(BreakoutCompleteLinesTemporalEvaluator):
@@ -133,9 +130,9 @@ class BreakoutCompleteRowsTemporalEvaluator(BreakoutCompleteLinesTemporalEvaluat
         super().__init__(input_space, bricks_cols=bricks_cols, bricks_rows=bricks_rows, lines_num=bricks_rows, gamma=gamma, on_the_fly=on_the_fly)
         self.bottom_up = bottom_up
 
-    def fromFeaturesToPropositional(self, features, **kwargs):
+    def fromFeaturesToBitmask(self, features, **kwargs):
         """complete rows from bottom-to-up or top-to-down, depending on self.bottom_up"""
-        return super().fromFeaturesToPropositional(features, axis=0, is_reversed=self.bottom_up)
+        return super().fromFeaturesToBitmask(features, axis=0, is_reversed=self.bottom_up)
 
 
 class BreakoutCompleteColumnsTemporalEvaluator(BreakoutCompleteLinesTemporalEvaluator):
@@ -145,9 +142,9 @@ class BreakoutCompleteColumnsTemporalEvaluator(BreakoutCompleteLinesTemporalEval
         super().__init__(input_space, bricks_cols=bricks_cols, bricks_rows=bricks_rows, lines_num=bricks_cols, gamma=gamma, on_the_fly=on_the_fly)
         self.left_right = left_right
 
-    def fromFeaturesToPropositional(self, features, **kwargs):
+    def fromFeaturesToBitmask(self, features, **kwargs):
         """complete columns from left-to-right or right-to-left, depending on self.left_right"""
-        return super().fromFeaturesToPropositional(features, axis=1, is_reversed=not self.left_right)
+        return super().fromFeaturesToBitmask(features, axis=1, is_reversed=not self.left_right)
 
 if __name__ == '__main__':
     env = GymBreakout(brick_cols=3)
@@ -162,7 +159,8 @@ if __name__ == '__main__':
     '''Temoral goal - specify how and what to complete (columns, rows or both)'''
     agent = TGAgent(BreakoutNRobotFeatureExtractor(env.observation_space),
                     RandomPolicy(env.action_space, epsilon=0.1),
-                    QLearning(None, env.action_space, alpha=None, gamma=gamma, nsteps=100),
+                    QLearning(None, env.action_space, alpha=None, gamma=gamma, nsteps=100,
+                              q_table=HashQTable(env.action_space.n)),
 
                     # Leave one of the following three option to see the differences:
                     # 1) rows
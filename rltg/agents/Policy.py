@@ -0,0 +1,72 @@
+"""Lightweight greedy policy exported from a trained agent (see RLAgent.export_policy)."""
+
+import _pickle as pickle
+from typing import List
+
+import numpy as np
+
+from rltg.agents.feature_extraction import RobotFeatureExtractor, TupleFeatureExtractor
+from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
+
+
+class Policy(object):
+
+    def __init__(self, sensors:RobotFeatureExtractor, actions:np.ndarray, states:np.ndarray=None,
+                 encoder:TupleFeatureExtractor=None, temporal_evaluators:List[TemporalEvaluator]=(),
+                 default_action=0):
+        """
+        :param sensors:             the feature extractor of the agent.
+        :param actions:             if states is None, the flat array of the actions indexed by the state,
+                                    otherwise the action of each of the states.
+        :param states:              None or the sorted array of the (integer) states.
+        :param encoder:             if not None, it maps the features (and the automata states) to an integer.
+        :param temporal_evaluators: the temporal evaluators of a TGAgent, whose states are part of the state.
+        :param default_action:      the action for the states not in `states` (i.e. never explored).
+        """
+        self.sensors = sensors
+        self.actions = actions
+        self.states = states
+        self.encoder = encoder
+        self.temporal_evaluators = list(temporal_evaluators)
+        self.default_action = default_action
+
+    def state_key(self, observation):
+        """:returns the integer state of the observation, as used by the brain of the agent."""
+        features = self.sensors(observation)
+        if self.temporal_evaluators:
+            features = features + tuple(te.get_state() for te in self.temporal_evaluators)
+        return features if self.encoder is None else self.encoder(features)
+
+    def lookup(self, keys):
+        """:returns the action (or the array of actions) of the integer state (or array of states) `keys`."""
+        if self.states is None:
+            return self.actions[keys]
+        if len(self.states) == 0:
+            return np.full(np.shape(keys), self.default_action)[()]
+
+        idx = np.minimum(np.searchsorted(self.states, keys), len(self.states) - 1)
+        return np.where(self.states[idx] == keys, self.actions[idx], self.default_action)[()]
+
+    def act(self, observation):
+        return self.lookup(self.state_key(observation))
+
+    def observe(self, observation):
+        """Update the automata with the new observation (if any)."""
+        for te in self.temporal_evaluators:
+            te.update(observation)
+
+    def reset(self):
+        for te in self.temporal_evaluators:
+            te.reset()
+
+    def is_failed(self):
+        return any(te.is_failed() for te in self.temporal_evaluators)
+
+    def save(self, filepath):
+        with open(filepath + "/policy.dump", "wb") as fout:
+            pickle.dump(self, fout)
+
+    @staticmethod
+    def load(filepath):
+        with open(filepath + "/policy.dump", "rb") as fin:
+            return pickle.load(fin)
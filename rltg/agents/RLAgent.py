@@ -1,10 +1,15 @@
 """Base class for every RL agent."""
 
 import _pickle as pickle
+from copy import deepcopy
 
+import numpy as np
+from gym.spaces import Tuple, Discrete
+
+from rltg.agents.Policy import Policy
 from rltg.agents.brains.Brain import Brain
 from rltg.agents.exploration_policies import ExplorationPolicy
-from rltg.agents.feature_extraction import RobotFeatureExtractor
+from rltg.agents.feature_extraction import RobotFeatureExtractor, TupleFeatureExtractor
 
 
 class RLAgent(object):
@@ -21,24 +26,47 @@ class RLAgent(object):
         :raises ValueError          if the space of the feature extractor output is different from the space of
                                     the brain input.
         """
-        if brain.observation_space and sensors.output_space != brain.observation_space:
-            raise ValueError("space dimensions are not compatible.")
+        self._check_observation_space(sensors, brain)
         self.sensors = sensors
         self.exploration_policy = exploration_policy
         self.brain = brain
         self.eval = eval
 
+        # the last observation whose features have been extracted, and its features.
+        self._last_observation = None
+        self._last_features = None
+
+    def _check_observation_space(self, sensors, brain):
+        """:raises ValueError if the brain specifies an observation space different from the sensors output."""
+        space = brain.observation_space
+        if space and (type(space) != type(sensors.output_space) or sensors.output_space != space):
+            raise ValueError("space dimensions are not compatible.")
+
     def set_eval(self, eval:bool):
         """Setter method for "eval" field."""
         self.eval = eval
 
+    def _extract_features(self, observation, cached=True):
+        """Extract the features of an observation at most once per step.
+        The features of the last observation are kept, keyed on the observation object:
+        the observation reached in a step (state2 in observe) is the one from which the agent acts
+        in the next step, and the one observed as 'state' afterwards.
+        :param cached: if False, always extract the features (e.g. for a just received observation,
+                       in case the environment reuses the same object).
+        """
+        if cached and observation is self._last_observation:
+            return self._last_features
+        features = self.sensors(observation)
+        self._last_observation, self._last_features = observation, features
+        return features
+
     def act(self, state, best_action=False):
         """Extract the features and call _act
         :param state:       the state from which the agent makes a move.
         :raises ValueError: if It the state is not contained into sensors.input_space
         :returns the chosen action
         """
-        features = self.sensors(state)
+        features = self._extract_features(state)
         return self._act(features, best_action=best_action)
 
 
@@ -60,8 +88,8 @@ class RLAgent(object):
 
     def observe(self, state, action, reward, state2):
         """Called at each observation. """
-        features_1 = self.sensors(state)
-        features_2 = self.sensors(state2)
+        features_1 = self._extract_features(state)
+        features_2 = self._extract_features(state2, cached=False)
         self._observe(features_1, action, reward, features_2)
 
     def _observe(self, features, action, reward, features2):
@@ -81,10 +109,15 @@ class RLAgent(object):
     def reset(self):
         """Called at the end of each episode.
         It MUST be called only once."""
+        self._last_observation, self._last_features = None, None
         if not self.eval:
             self.brain.reset()
             self.exploration_policy.reset()
 
+    def close(self):
+        """Called when the agent is no longer used, to release its resources."""
+        pass
+
     def save(self, filepath):
         with open(filepath + "/exploration_policy.dump", "wb") as fout:
             self.exploration_policy.reset()
@@ -95,6 +128,39 @@ class RLAgent(object):
         with open(filepath + "/sensors.dump", "wb") as fout:
             pickle.dump(self.sensors, fout)
 
+    def export_policy(self, filepath=None):
+        """Export the greedy policy learned by the brain in a compact Policy object,
+        which does not need the brain for answering the actions.
+        :param filepath: if not None, the directory where to save the policy (see Policy.load).
+        :raises ValueError if the states of the brain cannot be mapped to integers.
+        :returns the Policy."""
+        states, actions = self.brain.greedy_policy()
+        encoder = self._policy_encoder()
+        if states is not None:
+            if len(states) > 0 and isinstance(states[0], tuple):
+                if encoder is None:
+                    raise ValueError("cannot export the policy: the states are not integers "
+                                     "and the feature space is not a Tuple of Discrete.")
+                states = encoder.encode_batch(states)
+            states = np.asarray(states, dtype=np.int64)
+            order = np.argsort(states)
+            states, actions = states[order], actions[order]
+
+        policy = Policy(self.sensors, actions, states, encoder, deepcopy(self._policy_temporal_evaluators()))
+        if filepath is not None:
+            policy.save(filepath)
+        return policy
+
+    def _policy_encoder(self):
+        """:returns the map from the features to the integer states of the exported policy, if needed."""
+        space = self.sensors.output_space
+        if isinstance(space, Tuple) and all(isinstance(s, Discrete) for s in space.spaces):
+            return TupleFeatureExtractor(space)
+        return None
+
+    def _policy_temporal_evaluators(self):
+        return []
+
     def load(self, filepath):
         with open(filepath + "/exploration_policy.dump", "rb") as fin:
             self.exploration_policy = pickle.load(fin)
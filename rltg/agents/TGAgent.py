@@ -7,9 +7,11 @@ import os
 import re
 
 from rltg.agents.RLAgent import RLAgent
-from rltg.agents.feature_extraction import FeatureExtractor, RobotFeatureExtractor, TupleFeatureExtractor
+from rltg.agents.feature_extraction import FeatureExtractor, RobotFeatureExtractor, TupleFeatureExtractor, \
+    TupleStateEncoder
 from rltg.agents.brains.Brain import Brain
 from rltg.agents.exploration_policies import ExplorationPolicy
+from rltg.agents.temporal_evaluator.ProductTemporalEvaluator import ProductTemporalEvaluator
 from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
 from gym.spaces import Dict, Discrete, Box, Tuple
 
@@ -21,35 +23,98 @@ class TGAgent(RLAgent):
                  sensors: RobotFeatureExtractor,
                  exploration_policy:ExplorationPolicy,
                  brain:Brain,
-                 temporal_evaluators:List[TemporalEvaluator]):
+                 temporal_evaluators:List[TemporalEvaluator],
+                 product_automaton=False):
+        """
+        :param product_automaton: if True, the automata of the temporal evaluators are compiled into their
+                                  reachable product (see ProductTemporalEvaluator): then there is only one
+                                  automaton state in the agent state, and one automaton transition per step.
+        """
         assert len(temporal_evaluators)>=1
         super().__init__(sensors, exploration_policy, brain)
+        if product_automaton and len(temporal_evaluators) > 1:
+            temporal_evaluators = [ProductTemporalEvaluator(temporal_evaluators)]
         self.temporal_evaluators = temporal_evaluators
+        self._build_state_encoder()
 
+        # Check if the brain has the same input space dimensions,
+        # but only if the brain has specified an observation space.
+        # The brain can declare either the tuple space or the collapsed discrete space it actually receives.
+        if brain.observation_space:
+            expected_space = self._expected_brain_space()
+            if expected_space != brain.observation_space:
+                raise ValueError("The brain has incompatible observation space: {} instead of {}"
+                                 .format(brain.observation_space, expected_space))
+
+        # the state spaces of the automata on the fly change while training (see _update_automata_spaces):
+        # check now that the brain can follow them, instead of failing at the first change.
+        n_features = len(sensors.output_space.spaces)
+        changing = [n_features + i for i, te in enumerate(self.temporal_evaluators) if te.on_the_fly]
+        if changing and not brain.can_remap_states(changing):
+            raise ValueError("The brain cannot remap its states when the state spaces of the automata on the fly "
+                             "change (components {}): use compiled automata or another Q table."
+                             .format(changing))
+
+    def _build_state_encoder(self):
         # compute the feature space. It is the cartesian product between
         # the robot feature space output and the automata state space
         # sensors.output_space is expected to be a Tuple.
-        robot_feature_space = sensors.output_space
-        automata_state_spaces = [temp_eval.get_state_space() for temp_eval in temporal_evaluators]
+        robot_feature_space = self.sensors.output_space
+        automata_state_spaces = [temp_eval.get_state_space() for temp_eval in self.temporal_evaluators]
 
         # total feature space = (robot feature space, automata 1 state space, automata 2 state space, ... )
         feature_space = Tuple(robot_feature_space.spaces + tuple(automata_state_spaces))
 
-        # Check if the brain has the same input space dimensions,
-        # but only if the brain has specified an observation space.
-        if brain.observation_space and feature_space != brain.observation_space:
-            raise ValueError("The brain has incompatible observation space: {} instead of {}"
-                             .format(brain.observation_space, feature_space))
-
         # map every state from the space (N0, N1, ..., Nn) to a discrete space of dimension N0*N1*...*Nn-1
         self._from_tuple_to_int = TupleFeatureExtractor(feature_space)
+        # the same map, computed from the features and the automata states separately.
+        self._state_encoder = TupleStateEncoder(self._from_tuple_to_int, len(robot_feature_space.spaces))
+
+        # the features encoded last time, and their contribution to the collapsed state (see state_extractor)
+        self._encoded_features = None
+        self._features_code = 0
+
+    def _expected_brain_space(self):
+        if isinstance(self.brain.observation_space, Discrete):
+            return self._from_tuple_to_int.output_space
+        return self._from_tuple_to_int.input_space
+
+    def _update_automata_spaces(self, state_mappings=()):
+        """Rebuild the encoder when the state space of some automaton has changed, and remap the states known
+        by the brain. It happens when an on the fly automaton has discovered more states than its capacity
+        (which doubles, so a logarithmic number of times), or when it is replaced by the compiled one
+        (see TemporalEvaluator.swap_compiled).
+        :param state_mappings: for each automaton, None or the array of the new id of each old state id."""
+        old_encoder = self._from_tuple_to_int
+        self._build_state_encoder()
+        new_encoder = self._from_tuple_to_int
+        offset = len(self.sensors.output_space.spaces)
+
+        def mapping(states):
+            tuples = old_encoder.decode_batch(states)
+            for i, state_mapping in enumerate(state_mappings):
+                if state_mapping is not None:
+                    tuples[:, offset + i] = state_mapping[tuples[:, offset + i]]
+            return new_encoder.encode_batch(tuples)
+
+        if self.brain.observation_space:
+            self.brain.observation_space = self._expected_brain_space()
+        self.brain.remap_states(mapping, new_encoder.output_space.n, new_encoder.input_space)
+
+    def _check_observation_space(self, sensors, brain):
+        # the brain input includes the automata states: checked in __init__, once the feature space is known.
+        pass
 
     # TODO: allow customization of this component by modularization
-    def state_extractor(self, world_state, automata_states: List):
-        # the state is a tuple: (features, A1 state, ..., An state)
-        state = self.sensors(world_state) + tuple(automata_states)
-        collapsed_state = self._from_tuple_to_int(state)
-        return collapsed_state
+    def state_extractor(self, world_state, automata_states: List, cached=True):
+        # the state is the tuple (features, A1 state, ..., An state), collapsed to an integer.
+        # The features are encoded once per observation: when only the automata states change,
+        # only their part is encoded again.
+        features = self._extract_features(world_state, cached)
+        if not cached or features is not self._encoded_features:
+            self._encoded_features = features
+            self._features_code = self._state_encoder.encode_features(features)
+        return self._features_code + self._state_encoder.encode_automata(automata_states)
 
     # TODO: allow customization of this component by modularization
     def reward_extractor(self, world_reward, automata_rewards: List):
@@ -68,17 +133,36 @@ class TGAgent(RLAgent):
 
         # update the automata states given the new observed state and collect the reward
         states_automata, rewards_automata = zip(*[te.update(state2) for te in self.temporal_evaluators])
+        if any(s >= n for s, n in zip(states_automata, self._state_encoder.automata_sizes)):
+            self._update_automata_spaces()
 
         old_state  = self.state_extractor(state,  old_states_automata)
-        new_state2 = self.state_extractor(state2, states_automata)
+        new_state2 = self.state_extractor(state2, states_automata, cached=False)
         new_reward = self.reward_extractor(reward, rewards_automata)
         super()._observe(old_state, action, new_reward, new_state2)
 
+    def _policy_encoder(self):
+        return self._from_tuple_to_int
+
+    def _policy_temporal_evaluators(self):
+        return self.temporal_evaluators
+
     def reset(self):
         super().reset()
+        self._encoded_features, self._features_code = None, 0
         for te in self.temporal_evaluators:
             te.reset()
 
+        # the automata compiled in background replace the on the fly ones between the episodes.
+        state_mappings = [te.swap_compiled() for te in self.temporal_evaluators]
+        if any(state_mapping is not None for state_mapping in state_mappings):
+            self._update_automata_spaces(state_mappings)
+
+    def close(self):
+        # e.g. the compilations of the automata still running in background.
+        for te in self.temporal_evaluators:
+            te.close()
+
     def save(self, filepath):
         super().save(filepath)
         for idx, te in enumerate(self.temporal_evaluators):
@@ -94,4 +178,7 @@ class TGAgent(RLAgent):
             with open(filepath + "/%s" % te_name, "rb") as fin:
                 te = pickle.load(fin)
                 temporal_evaluators.append(te)
+        self.close()
         self.temporal_evaluators = temporal_evaluators
+        # the states of the brain are encoded with the state spaces of the saved automata.
+        self._build_state_encoder()
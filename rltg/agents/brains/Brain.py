@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
 from gym.core import Space
 
 
@@ -27,6 +28,29 @@ class Brain(ABC):
         e.g. in Q-Learning, select the argmax of the Q-values relative to the 'state' parameter."""
         raise NotImplementedError
 
+    def choose_actions(self, states, **kwargs):
+        """Batched version of choose_action: from a sequence of states, return the array of the actions.
+        Subclasses should override it with a vectorized implementation."""
+        return np.array([self.choose_action(s, **kwargs) for s in states])
+
+    def greedy_policy(self):
+        """Export the deterministic greedy policy learned so far (i.e. choose_action(state, optimal=True)).
+        :returns (states, actions): if states is None, actions is a flat array indexed by the (integer) states,
+                                    otherwise actions[i] is the action of states[i], for every explored state."""
+        raise NotImplementedError
+
+    def remap_states(self, mapping, n_states=None, space=None):
+        """Change the keys of the (integer) states learned so far, e.g. when the state space grows.
+        :param mapping:  a function from an array of old states to the array of the new ones (see QTable.remap).
+        :param n_states: the size of the new state space.
+        :param space:    the new Tuple space of the states."""
+        raise NotImplementedError
+
+    def can_remap_states(self, components):
+        """:param components: the indexes of the components of the Tuple space of the states which may change.
+        :returns True if remap_states supports the changes of these components."""
+        return False
+
     @abstractmethod
     def learn(self):
         """The method performing the learning (e.g. in Q-Learning, update the table)"""
@@ -0,0 +1,88 @@
+from collections import deque
+
+import numpy as np
+
+
+class NStepBuffer(object):
+    """Ring buffer of the last `nsteps` (s, a, r, s') transitions, which keeps
+    the discounted sum of the rewards in the window updated at constant amortized cost.
+
+    The transitions are split in blocks of `nsteps` elements. For the current block only the
+    running discounted return is kept; when a block is full, it is sealed by computing
+    (once, backwards) the discounted return of each of its suffixes. The return of the window
+    is then the suffix return of the sealed block plus the discounted return of the current block:
+    >>>G(tau) = sealed_suffix_return[tau] + gamma^(block_start - tau) * block_return
+    No subtraction/division is performed, so no numerical error accumulates along the episode.
+    """
+
+    def __init__(self, nsteps, gamma):
+        self.nsteps = nsteps
+        self.gamma = gamma
+        # gamma^0, gamma^1, ..., gamma^nsteps
+        self.gamma_powers = np.power(float(gamma), np.arange(nsteps + 1))
+        self.clear()
+
+    def clear(self):
+        self._transitions = deque(maxlen=self.nsteps)
+        # number of transitions appended since the last clear
+        self._t = 0
+
+        # absolute index of the first transition of the current block and its discounted return
+        self._block_start = 0
+        self._block_return = 0.0
+
+        # absolute index of the first transition of the last sealed block and its suffix returns
+        self._sealed_start = 0
+        self._sealed_returns = np.zeros(0)
+
+    def append(self, transition):
+        """Append a (s, a, r, s') transition. If the buffer is full, the oldest one is dropped."""
+        self._transitions.append(transition)
+        self._block_return += self.gamma_powers[self._t - self._block_start] * transition[2]
+        self._t += 1
+
+        if self._t - self._block_start == self.nsteps:
+            # the current block is exactly the content of the buffer.
+            self._sealed_returns = self.suffix_returns()
+            self._sealed_start = self._block_start
+            self._block_start = self._t
+            self._block_return = 0.0
+
+    def is_full(self):
+        return len(self._transitions) == self.nsteps
+
+    def discounted_return(self):
+        """:returns gamma^0*r0 + gamma^1*r1 + ... + gamma^N-1*r_N-1 over the transitions in the buffer"""
+        tau = self._t - len(self._transitions)
+        if tau >= self._block_start:
+            return self._block_return
+        return self._sealed_returns[tau - self._sealed_start] \
+               + self.gamma_powers[self._block_start - tau] * self._block_return
+
+    def suffix_returns(self):
+        """:returns the array of the discounted returns of every suffix of the buffer,
+                    from the longest to the shortest. Costs O(nsteps)."""
+        returns = np.empty(len(self._transitions))
+        g = 0.0
+        for i, transition in zip(range(len(self._transitions) - 1, -1, -1), reversed(self._transitions)):
+            g = transition[2] + self.gamma * g
+            returns[i] = g
+        return returns
+
+    def __len__(self):
+        return len(self._transitions)
+
+    def __getitem__(self, item):
+        return self._transitions[item]
+
+    def __iter__(self):
+        return iter(self._transitions)
+
+    def map_states(self, mapping):
+        """Replace the states s and s' of every transition, where mapping is a function
+        from an array of states to the array of the new ones. The returns are not affected."""
+        if not self._transitions:
+            return
+        states = mapping(np.array([(s, s2) for s, _, _, s2 in self._transitions]).ravel()).reshape(-1, 2).tolist()
+        self._transitions = deque(((s, a, r, s2) for (s, s2), (_, a, r, _) in zip(states, self._transitions)),
+                                  maxlen=self.nsteps)
@@ -1,109 +1,131 @@
-import random
 from abc import abstractmethod
 
 import numpy as np
-import math
 
 from gym.core import Space
 from gym.spaces import Discrete
 
+from rltg.agents.brains import kernels
 from rltg.agents.brains.Brain import Brain
+from rltg.agents.brains.NStepBuffer import NStepBuffer
+from rltg.agents.brains.qtables.DenseQTable import DenseQTable
+from rltg.agents.brains.qtables.QTable import QTable, DictQTable
 
 
 class TDBrain(Brain):
-    def __init__(self, observation_space:Discrete, action_space:Space, gamma=0.99, alpha=None, nsteps=300):
+    def __init__(self, observation_space:Discrete, action_space:Space, gamma=0.99, alpha=None, nsteps=300,
+                 q_table:QTable=None):
+        """
+        :param q_table: the storage of the Q values and of the visit counts.
+                        If None, a dense table is used when the observation space is Discrete,
+                        otherwise a sparse (dictionary) representation.
+                        When the states are integers (e.g. in TGAgent) but the space is unknown or huge,
+                        a HashQTable is much more compact than the dictionary.
+        """
         super().__init__(observation_space, action_space)
 
-        self.Visits = {}
         self.gamma = gamma
         self.alpha = alpha
 
-        # sparse representation
-        self.Q = {}
+        if q_table is None:
+            q_table = self._default_q_table()
+        self.Q = q_table
         self.nsteps = nsteps
-        self.obs_history = []
+        # ring buffer of the last nsteps observations, with the rolling discounted return.
+        self.obs_history = NStepBuffer(nsteps, gamma)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # brains pickled before the QTable backends: the Q values and the visit counts were two dictionaries.
+        if isinstance(self.Q, dict):
+            q_table = DictQTable(self.action_space.n)
+            q_table.Q = self.Q
+            q_table.Visits = self.__dict__.pop("Visits", {})
+            self.Q = q_table
+        # and the observations were a list (always empty, since the brain is reset before saving it).
+        if not isinstance(self.obs_history, NStepBuffer):
+            self.obs_history = NStepBuffer(self.nsteps, self.gamma)
 
     def choose_action(self, state, optimal=False):
-        Q_values = self.Q[state] if state in self.Q else np.zeros((self.action_space.n,))
-        argmaxes = np.argwhere(Q_values == Q_values.max()).flatten()
+        # if optimal, determistic behavior, otherwise break ties randomly.
+        return kernels.greedy_action(self.Q[state], optimal)
+
+    def choose_actions(self, states, optimal=False):
+        """Greedy actions for an array of states, in one vectorized pass.
+        The ties are broken randomly, or by taking the first action if optimal."""
+        Q_values = self.Q.get_rows(states)
+        ties = Q_values == Q_values.max(axis=1, keepdims=True)
         if optimal:
-            # determistic behavior!
-            action = argmaxes[0]
-        else:
-            # allow randomness
-            action = random.choice(argmaxes)
+            return np.argmax(ties, axis=1)
+        # uniform among the ties: the maximum random number among them
+        return np.argmax(np.where(ties, np.random.random_sample(ties.shape), -1.0), axis=1)
 
-        # action = random.choice(argmaxes)
-        return action
+    def greedy_policy(self):
+        return self.Q.greedy_policy()
 
     def learn(self):
-        if self.episode_iteration + 1 < self.nsteps:
-            # no enough observations. + 1 for manage the case when nsteps=1 and iteration=0
+        if not self.obs_history.is_full():
+            # no enough observations.
             return
 
-        tau = self.episode_iteration + 1 - self.nsteps
-        self._nsteps_update(self.obs_history[tau: tau + self.nsteps])
+        _, _, _, s_tn = self.obs_history[-1]
+        self._nsteps_update(self.obs_history[0], self.obs_history.discounted_return(), s_tn)
 
     def observe(self, state, action, reward, state2):
         super().observe(state, action, reward, state2)
-        # self.obs_history.append((state, action, reward, state2))
-        # if len(self.obs_history)==self.nsteps:
-            # delete oldest element
-            # self.obs_history.pop(0)
         self.incVisits(state, action)
 
     def reset(self):
-        t = self.episode_iteration - self.nsteps
-        for i in range(t, self.episode_iteration):
-            self._nsteps_update(self.obs_history[i:], last=True)
+        # update the remaining observations with the return of the rest of the episode (no bootstrap)
+        returns = self.obs_history.suffix_returns()
+        for obs, n_reward_return in zip(list(self.obs_history), returns):
+            self._nsteps_update(obs, n_reward_return)
 
-        self.obs_history = []
+        self.obs_history.clear()
         super().reset()
 
 
-    def _nsteps_update(self, partial_history, last=False):
-        if len(partial_history)<1:
-            return
+    def _nsteps_update(self, first_obs, n_reward_return, s_tn=None):
+        """Update Q(s_tau, a_tau) towards the n-step return.
+        :param first_obs:       the (s, a, r, s') observation at time tau.
+        :param n_reward_return: gamma^0*r0 + gamma^1*r1 + ... + gamma^N-1*r_n-1
+        :param s_tn:            the state reached after nsteps observations, used for bootstrap.
+                                If None, the episode is ended and no bootstrap is done.
+        """
+        if s_tn is not None:
+            # add the value of the Q function, depending on the type of algorithm (see the getQa method)
+            n_reward_return += self.obs_history.gamma_powers[self.nsteps] * self.getQa(s_tn)
 
-        n_reward_return = 0
-        N = len(partial_history)
-        # gamma^0*r0 + gamma^1*r1 + ... + gamma^N-1*r_n-1
-        for i in range(N):
-            n_reward_return += partial_history[i][2] * math.pow(self.gamma, i)
+        s_tau, a_tau, _, _ = first_obs
+        self.Q.backup(s_tau, a_tau, n_reward_return, self.alpha)
 
-        if not last:
-            # add the value of the Q function, depending on the type of algorithm (see the getQa method)
-            _, _, _, s_tn = partial_history[-1]
-            Q_tn = self.getQa(s_tn)
-            n_reward_return += math.pow(self.gamma, N) * Q_tn
+    def remap_states(self, mapping, n_states=None, space=None):
+        self.Q.remap(mapping, n_states, space)
+        self.obs_history.map_states(mapping)
 
-        s_tau, a_tau, _, _ = partial_history[0]
-        delta = n_reward_return - self.Q.get(s_tau, np.zeros(self.action_space.n))[a_tau]
+    def can_remap_states(self, components):
+        return self.Q.can_remap(components)
 
-        if s_tau not in self.Q:
-            self.Q[s_tau] = np.zeros(self.action_space.n)
-        self.Q[s_tau][a_tau] += self.getAlphaVisitsInc(s_tau, a_tau) * delta
+    def _default_q_table(self):
+        if isinstance(self.observation_space, Discrete):
+            return DenseQTable(self.observation_space.n, self.action_space.n)
+        else:
+            return DictQTable(self.action_space.n)
 
     def setVisits(self, x, a, q):
-        if not x in self.Visits:
-            self.Visits[x] = np.zeros(self.action_space.n)
-        self.Visits[x][a] = q
+        self.Q.set_visits(x, a, q)
 
     def incVisits(self, x, a):
-        self.setVisits(x,a,self.getVisits(x,a)+1)
+        return self.Q.inc_visits(x, a)
 
     def getVisits(self, x, a):
-        if x in self.Visits:
-            return self.Visits[x][a]
-        else:
-            return 0
+        return self.Q.get_visits(x, a)
 
     def getAlphaVisitsInc(self, x, a):
         if self.alpha:
             return self.alpha
 
-        self.incVisits(x,a)
-        s = self.getVisits(x,a)
+        s = self.incVisits(x,a)
         try: #TODO debug here
             a = 1.0/float(s)
         except:
@@ -112,7 +134,7 @@ class TDBrain(Brain):
         return a # math.sqrt(s)
 
     def getSumVisits(self, x):
-        return np.sum(self.Visits[x,:])
+        return np.sum(self.Q.visits_row(x))
 
 
     @abstractmethod
@@ -122,19 +144,21 @@ class TDBrain(Brain):
 
 
 class QLearning(TDBrain):
-    def __init__(self, observation_space:Discrete, action_space, gamma=0.99, alpha=None, nsteps=200):
-        super().__init__(observation_space, action_space, gamma, alpha, nsteps)
+    def __init__(self, observation_space:Discrete, action_space, gamma=0.99, alpha=None, nsteps=200,
+                 q_table:QTable=None):
+        super().__init__(observation_space, action_space, gamma, alpha, nsteps, q_table)
 
     def getQa(self, s):
-        maxQa = max(self.Q.get(s, np.zeros(self.action_space.n)))
+        maxQa = kernels.max_value(self.Q[s])
         return maxQa
 
 
 class Sarsa(TDBrain):
-    def __init__(self, observation_space:Discrete, action_space, gamma=0.99, alpha=None, nsteps=200):
-        super().__init__(observation_space, action_space, gamma, alpha, nsteps)
+    def __init__(self, observation_space:Discrete, action_space, gamma=0.99, alpha=None, nsteps=200,
+                 q_table:QTable=None):
+        super().__init__(observation_space, action_space, gamma, alpha, nsteps, q_table)
 
     def getQa(self, s):
         a = self.choose_action(s)
-        q = self.Q.get(s, np.zeros(self.action_space.n))[a]
+        q = self.Q[s][a]
         return q
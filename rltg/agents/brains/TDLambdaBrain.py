@@ -0,0 +1,125 @@
+from abc import abstractmethod
+
+import numpy as np
+from gym.core import Space
+from gym.spaces import Discrete
+
+from rltg.agents.brains import kernels
+from rltg.agents.brains.Brain import Brain
+from rltg.agents.brains.TDBrain import TDBrain
+from rltg.agents.brains.qtables.QTable import QTable
+
+
+class TDLambdaBrain(TDBrain):
+    """TD(lambda) with eligibility traces (backward view).
+
+    Instead of waiting nsteps observations, every observation updates immediately all the
+    state-action pairs with a live trace. The traces are sparse: only the recently visited pairs
+    are kept, and a trace is dropped as soon as it decays below `trace_threshold`. Hence the cost
+    of a step depends on the number of live traces, roughly log(trace_threshold)/log(gamma*lambd),
+    and not on the horizon.
+
+    The traces are decayed at the beginning of the next step, so that at the end of the episode they are still
+    the ones of the last update: reset() removes the bootstrap from it, since the last state is terminal."""
+
+    def __init__(self, observation_space:Discrete, action_space:Space, gamma=0.99, alpha=None, lambd=0.9,
+                 replacing=False, trace_threshold=1e-3, q_table:QTable=None):
+        """
+        :param lambd:           the trace decay parameter (lambda).
+        :param replacing:       if True, use replacing traces (the trace of the visited pair is set to 1),
+                                otherwise accumulating traces (the trace of the visited pair is incremented by 1).
+        :param trace_threshold: the traces below this value are discarded.
+        """
+        # only the last observation is needed.
+        super().__init__(observation_space, action_space, gamma, alpha, nsteps=1, q_table=q_table)
+        self.lambd = lambd
+        self.replacing = replacing
+        self.trace_threshold = trace_threshold
+
+        # sparse representation: (state, action) -> eligibility
+        self.traces = {}
+        # gamma * Q(s', a') of the last update
+        self._last_bootstrap = 0.0
+
+    def learn(self):
+        if len(self.obs_history) < 1:
+            return
+
+        s, a, r, s2 = self.obs_history[-1]
+        self._decay_traces()
+        if self.cutTraces(s, a):
+            self.traces.clear()
+
+        self._last_bootstrap = self.gamma * self.getQa(s2)
+        delta = r + self._last_bootstrap - self.Q[s][a]
+
+        if self.replacing:
+            self.traces[(s, a)] = 1.0
+        else:
+            self.traces[(s, a)] = self.traces.get((s, a), 0.0) + 1.0
+
+        for (x, b), e in self.traces.items():
+            self.Q.update(x, b, self.getAlphaVisits(x, b) * delta * e)
+
+    def _decay_traces(self):
+        decay = self.gamma * self.lambd
+        expired = []
+        for (x, b), e in self.traces.items():
+            e *= decay
+            if e < self.trace_threshold:
+                expired.append((x, b))
+            else:
+                self.traces[(x, b)] = e
+
+        for k in expired:
+            del self.traces[k]
+
+    def reset(self):
+        # the last observation has already been used in learn(), bootstrapping from the terminal state:
+        # the same update with delta = -gamma * Q(s', a') makes it a non bootstrapped one.
+        for (x, b), e in self.traces.items():
+            self.Q.update(x, b, -self.getAlphaVisits(x, b) * self._last_bootstrap * e)
+        self._last_bootstrap = 0.0
+        self.traces.clear()
+        self.obs_history.clear()
+        Brain.reset(self)
+
+    def remap_states(self, mapping, n_states=None, space=None):
+        super().remap_states(mapping, n_states, space)
+        if self.traces:
+            pairs = list(self.traces.keys())
+            new_states = mapping(np.array([x for x, _ in pairs])).tolist()
+            self.traces = {(x, b): self.traces[(old_x, b)] for x, (old_x, b) in zip(new_states, pairs)}
+
+    def getAlphaVisits(self, x, a):
+        """Like getAlphaVisitsInc, but without incrementing the visits,
+        since the same pair is updated many times while its trace is alive."""
+        if self.alpha:
+            return self.alpha
+        return 1.0 / max(self.getVisits(x, a), 1)
+
+    def cutTraces(self, s, a):
+        """:returns True if the traces must be reset before taking action 'a' in state 's'."""
+        return False
+
+    @abstractmethod
+    def getQa(self, s):
+        raise NotImplementedError
+
+
+class WatkinsQLambda(TDLambdaBrain):
+    """Watkins's Q(lambda): the traces are cut whenever a non-greedy action is taken."""
+
+    def getQa(self, s):
+        return kernels.max_value(self.Q[s])
+
+    def cutTraces(self, s, a):
+        Q_values = self.Q[s]
+        return Q_values[a] != kernels.max_value(Q_values)
+
+
+class SarsaLambda(TDLambdaBrain):
+
+    def getQa(self, s):
+        a = self.choose_action(s)
+        return self.Q[s][a]
@@ -0,0 +1,92 @@
+"""Inner kernels of the TD brains, executed once per environment step.
+
+If Numba is importable, they are compiled (with Numba semantics for the random tie-breaking),
+otherwise they fall back transparently to pure NumPy. The compiled kernels can be switched off
+at runtime with `enable_jit(False)` (or with the NUMBA_DISABLE_JIT environment variable)."""
+
+import random
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def _numpy_greedy_action(q_values, optimal=False):
+    argmaxes = np.argwhere(q_values == q_values.max()).flatten()
+    if optimal:
+        # determistic behavior!
+        return argmaxes[0]
+    else:
+        # allow randomness
+        return random.choice(argmaxes)
+
+
+def _numpy_max_value(q_values):
+    return q_values.max()
+
+
+def _td_backup(Q, Visits, s, a, target, alpha):
+    """Q[s, a] += alpha * (target - Q[s, a]).
+    If alpha is not positive, use alpha = 1/N(s, a) after incrementing N(s, a)."""
+    if alpha <= 0.0:
+        Visits[s, a] += 1
+        alpha = 1.0 / Visits[s, a]
+    Q[s, a] += alpha * (target - Q[s, a])
+
+
+def _kth_greedy_action(q_values, u):
+    """:returns the k-th action with the maximum value, where k = floor(u * number of ties).
+    u < 0 means the first one."""
+    best = q_values[0]
+    n_ties = 1
+    for i in range(1, q_values.shape[0]):
+        v = q_values[i]
+        if v > best:
+            best = v
+            n_ties = 1
+        elif v == best:
+            n_ties += 1
+
+    k = 0 if u < 0.0 else min(int(u * n_ties), n_ties - 1)
+    for i in range(q_values.shape[0]):
+        if q_values[i] == best:
+            if k == 0:
+                return i
+            k -= 1
+    return 0
+
+
+def _max_value(q_values):
+    best = q_values[0]
+    for i in range(1, q_values.shape[0]):
+        if q_values[i] > best:
+            best = q_values[i]
+    return best
+
+
+if NUMBA_AVAILABLE:
+    _jit_kth_greedy_action = numba.njit(cache=True)(_kth_greedy_action)
+    _jit_max_value = numba.njit(cache=True)(_max_value)
+    _jit_td_backup = numba.njit(cache=True)(_td_backup)
+
+    def _jit_greedy_action(q_values, optimal=False):
+        return _jit_kth_greedy_action(q_values, -1.0 if optimal else random.random())
+
+
+def enable_jit(enabled=True):
+    """Select the compiled kernels (if Numba is available) or the NumPy ones."""
+    global greedy_action, max_value, td_backup, JIT_ENABLED
+    JIT_ENABLED = enabled and NUMBA_AVAILABLE
+    if JIT_ENABLED:
+        greedy_action, max_value, td_backup = _jit_greedy_action, _jit_max_value, _jit_td_backup
+    else:
+        greedy_action, max_value, td_backup = _numpy_greedy_action, _numpy_max_value, _td_backup
+
+
+greedy_action = max_value = td_backup = JIT_ENABLED = None
+enable_jit(True)
@@ -0,0 +1,232 @@
+import numpy as np
+
+from rltg.agents.brains import kernels
+from rltg.agents.brains.qtables.QTable import QTable
+
+EVICTION_POLICIES = ("lru", "least_visited", "combined")
+
+# bits of the filter of the evicted states for each remembered state
+_FILTER_BITS_PER_STATE = 16
+# 2^64 / golden ratio, for mixing the hash of the states (see HashQTable)
+_FIBONACCI = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class BoundedQTable(QTable):
+    """Sparse representation with a fixed memory budget: at most `capacity` states are stored.
+
+    When a new state arrives and the table is full, the `eviction_ratio` fraction of the states
+    with the lowest score is evicted in one vectorized pass. The score depends on `eviction_policy`:
+    - "lru":            the last time the state was updated (least recently updated first);
+    - "least_visited":  the total visit count of the state (least visited first);
+    - "combined":       (1 + visits) / (1 + time since the last update);
+    - a callable:       a function f(table) -> array of scores, one for each slot.
+
+    The recently evicted states are remembered in a Bloom filter, in order to count approximately how many
+    evicted states are discovered again (`n_rediscoveries`). The filter has two generations of
+    `filter_size` states each: when the current one is full, it becomes the old one and the previous old one
+    is dropped, so a rediscovery is counted if the state was evicted in the last filter_size to 2*filter_size
+    evictions. Each generation has 16 bits per state and `filter_hashes` hash functions: with the default 4,
+    the false positive rate is below 0.25% for each generation, i.e. below 0.5% overall.
+    Works with any hashable state."""
+
+    def __init__(self, n_actions:int, capacity:int, eviction_policy="lru", eviction_ratio=0.05,
+                 filter_size:int=None, filter_hashes=4, dtype=np.float32, visits_dtype=np.int32):
+        """
+        :param capacity:        the maximum number of stored states.
+        :param eviction_policy: one of EVICTION_POLICIES, or a callable (see above).
+        :param eviction_ratio:  the fraction of the capacity evicted when the table is full.
+        :param filter_size:     the number of evicted states in each generation of the filter. By default, capacity.
+        :param filter_hashes:   the number of hash functions of the filter.
+        :raises ValueError      if the eviction policy is unknown.
+        """
+        super().__init__(n_actions)
+        if not callable(eviction_policy) and eviction_policy not in EVICTION_POLICIES:
+            raise ValueError("unknown eviction policy: {}. Choose among {} or a callable."
+                             .format(eviction_policy, EVICTION_POLICIES))
+        self.capacity = capacity
+        self.eviction_policy = eviction_policy
+        self.eviction_ratio = eviction_ratio
+
+        self.slots = {}
+        self.states = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+        self.Q = np.zeros((capacity, n_actions), dtype=dtype)
+        self.Visits = np.zeros((capacity, n_actions), dtype=visits_dtype)
+        self.explored = np.zeros(capacity, dtype=np.bool_)
+        self.last_update = np.zeros(capacity, dtype=np.int64)
+        self.tick = 0
+        self.n_explored = 0
+
+        self.n_evictions = 0
+        self.n_rediscoveries = 0
+        self._allocate_filter(filter_size or capacity, filter_hashes)
+
+        self._zeros = np.zeros(n_actions, dtype=dtype)
+        self._zeros.flags.writeable = False
+
+    def _allocate_filter(self, filter_size, filter_hashes):
+        self.filter_size = filter_size
+        self.filter_hashes = filter_hashes
+        n_bits = 1 << max(8, (_FILTER_BITS_PER_STATE * filter_size - 1).bit_length())
+        self._filter_mask = n_bits - 1
+        self._clear_filter()
+
+    def _clear_filter(self):
+        # the current and the old generation, as packed bits (bytearrays are the fastest to index one at a time)
+        n_bytes = (self._filter_mask + 1) >> 3
+        self._evicted_filters = [bytearray(n_bytes), bytearray(n_bytes)]
+        # the number of states added to the current generation
+        self._filter_count = 0
+
+    def _filter_hash(self, state):
+        """:returns the two hashes of `state`, combined as h1 + i*h2 for i < filter_hashes (double hashing)."""
+        h = (hash(state) * _FIBONACCI) & _MASK64
+        return h >> 32, (h & 0xFFFFFFFF) | 1
+
+    def _remember_evicted(self, state):
+        if self._filter_count == self.filter_size:
+            self._evicted_filters = [bytearray(len(self._evicted_filters[0])), self._evicted_filters[0]]
+            self._filter_count = 0
+        current, mask = self._evicted_filters[0], self._filter_mask
+        i, step = self._filter_hash(state)
+        for _ in range(self.filter_hashes):
+            j = i & mask
+            current[j >> 3] |= 1 << (j & 7)
+            i += step
+        self._filter_count += 1
+
+    def _was_evicted(self, state):
+        h, step = self._filter_hash(state)
+        mask = self._filter_mask
+        for f in self._evicted_filters:
+            i = h
+            for _ in range(self.filter_hashes):
+                j = i & mask
+                if not f[j >> 3] & (1 << (j & 7)):
+                    break
+                i += step
+            else:
+                return True
+        return False
+
+    def _touch(self, state):
+        """:returns the slot of `state`, adding it if not present, and mark it as just updated."""
+        i = self.slots.get(state)
+        if i is None:
+            if not self.free_slots:
+                self._evict()
+            i = self.free_slots.pop()
+            self.slots[state] = i
+            self.states[i] = state
+            if self._was_evicted(state):
+                self.n_rediscoveries += 1
+        self.tick += 1
+        self.last_update[i] = self.tick
+        return i
+
+    def eviction_scores(self):
+        """:returns the score of every slot. The lower, the sooner evicted."""
+        if callable(self.eviction_policy):
+            return self.eviction_policy(self)
+        elif self.eviction_policy == "lru":
+            return self.last_update
+        elif self.eviction_policy == "least_visited":
+            return self.Visits.sum(axis=1)
+        else:
+            return (1.0 + self.Visits.sum(axis=1)) / (1.0 + self.tick - self.last_update)
+
+    def _evict(self):
+        n = min(max(1, int(self.eviction_ratio * self.capacity)), self.capacity)
+        victims = np.argpartition(self.eviction_scores(), n - 1)[:n]
+        for i in victims:
+            state = self.states[i]
+            del self.slots[state]
+            self.states[i] = None
+            self._remember_evicted(state)
+
+        self.n_explored -= int(np.count_nonzero(self.explored[victims]))
+        self.Q[victims] = 0
+        self.Visits[victims] = 0
+        self.explored[victims] = False
+        self.last_update[victims] = 0
+        self.free_slots.extend(victims.tolist())
+        self.n_evictions += n
+
+    def __getitem__(self, state):
+        i = self.slots.get(state)
+        return self._zeros if i is None else self.Q[i]
+
+    def get_rows(self, states):
+        slots = np.array([self.slots.get(s, -1) for s in states], dtype=np.int64)
+        found = slots >= 0
+        rows = np.zeros((len(slots), self.n_actions), dtype=self.Q.dtype)
+        rows[found] = self.Q[slots[found]]
+        return rows
+
+    def __contains__(self, state):
+        i = self.slots.get(state)
+        return i is not None and bool(self.explored[i])
+
+    def __len__(self):
+        return self.n_explored
+
+    def update(self, state, action, delta):
+        i = self._touch(state)
+        if not self.explored[i]:
+            self.explored[i] = True
+            self.n_explored += 1
+        self.Q[i, action] += delta
+
+    def backup(self, state, action, target, alpha=None):
+        i = self._touch(state)
+        if not self.explored[i]:
+            self.explored[i] = True
+            self.n_explored += 1
+        kernels.td_backup(self.Q, self.Visits, i, action, target, alpha or 0.0)
+
+    def get_visits(self, state, action):
+        i = self.slots.get(state)
+        return 0 if i is None else self.Visits[i, action]
+
+    def set_visits(self, state, action, value):
+        self.Visits[self._touch(state), action] = value
+
+    def inc_visits(self, state, action):
+        i = self._touch(state)
+        self.Visits[i, action] += 1
+        return self.Visits[i, action]
+
+    def remap(self, mapping, n_states=None, space=None):
+        """The filter of the evicted states is cleared, since it refers to the old states."""
+        slots = np.array(list(self.slots.values()), dtype=np.int64)
+        self.slots = {}
+        if len(slots) > 0:
+            old_states = np.array([self.states[i] for i in slots])
+            new_states = mapping(old_states)
+            kept = np.zeros(len(slots), dtype=np.bool_)
+            kept[self._survivors(old_states, new_states, self.Visits[slots].sum(axis=1))] = True
+
+            merged = slots[~kept]
+            for i in merged.tolist():
+                self.states[i] = None
+            self.n_explored -= int(np.count_nonzero(self.explored[merged]))
+            self.Q[merged] = 0
+            self.Visits[merged] = 0
+            self.explored[merged] = False
+            self.last_update[merged] = 0
+            self.free_slots.extend(merged.tolist())
+
+            for i, s in zip(slots[kept].tolist(), new_states[kept].tolist()):
+                self.states[i] = s
+                self.slots[s] = i
+        self._clear_filter()
+
+    def greedy_policy(self):
+        slots = [i for i in self.slots.values() if self.explored[i]]
+        return [self.states[i] for i in slots], self._actions_array(np.argmax(self.Q[slots], axis=1))
+
+    def visits_row(self, state):
+        i = self.slots.get(state)
+        return self._zeros if i is None else self.Visits[i]
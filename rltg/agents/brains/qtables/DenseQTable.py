@@ -0,0 +1,73 @@
+import numpy as np
+
+from rltg.agents.brains import kernels
+from rltg.agents.brains.qtables.QTable import QTable
+
+
+class DenseQTable(QTable):
+    """Preallocated representation for a Discrete(n) observation space:
+    Q values and visit counts are stored as contiguous (n, n_actions) matrices,
+    so that reads and writes are plain index operations."""
+
+    def __init__(self, n_states:int, n_actions:int, dtype=np.float32, visits_dtype=np.int32):
+        super().__init__(n_actions)
+        self.n_states = n_states
+        self.Q = np.zeros((n_states, n_actions), dtype=dtype)
+        self.Visits = np.zeros((n_states, n_actions), dtype=visits_dtype)
+
+        # keep track of the explored states, for __len__ and __contains__
+        self.explored = np.zeros(n_states, dtype=np.bool_)
+        self.n_explored = 0
+
+    def __getitem__(self, state):
+        return self.Q[state]
+
+    def get_rows(self, states):
+        return self.Q[np.asarray(states, dtype=np.int64)]
+
+    def __contains__(self, state):
+        return bool(self.explored[state])
+
+    def __len__(self):
+        return self.n_explored
+
+    def update(self, state, action, delta):
+        if not self.explored[state]:
+            self.explored[state] = True
+            self.n_explored += 1
+        self.Q[state, action] += delta
+
+    def backup(self, state, action, target, alpha=None):
+        if not self.explored[state]:
+            self.explored[state] = True
+            self.n_explored += 1
+        kernels.td_backup(self.Q, self.Visits, state, action, target, alpha or 0.0)
+
+    def get_visits(self, state, action):
+        return self.Visits[state, action]
+
+    def set_visits(self, state, action, value):
+        self.Visits[state, action] = value
+
+    def inc_visits(self, state, action):
+        self.Visits[state, action] += 1
+        return self.Visits[state, action]
+
+    def visits_row(self, state):
+        return self.Visits[state]
+
+    def remap(self, mapping, n_states=None, space=None):
+        n_states = self.n_states if n_states is None else n_states
+        old_states = np.arange(self.n_states)
+        new_states = mapping(old_states)
+        survivors = self._survivors(old_states, new_states, self.Visits.sum(axis=1))
+        for field in ("Q", "Visits", "explored"):
+            old = getattr(self, field)
+            new = np.zeros((n_states,) + old.shape[1:], dtype=old.dtype)
+            new[new_states[survivors]] = old[survivors]
+            setattr(self, field, new)
+        self.n_explored = int(np.count_nonzero(self.explored))
+        self.n_states = n_states
+
+    def greedy_policy(self):
+        return None, self._actions_array(np.argmax(self.Q, axis=1))
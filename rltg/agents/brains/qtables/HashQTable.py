@@ -0,0 +1,185 @@
+import numpy as np
+
+from rltg.agents.brains import kernels
+from rltg.agents.brains.qtables.QTable import QTable
+
+# marker of the free slots in the keys array
+EMPTY = np.iinfo(np.int64).min
+# 2^64 / golden ratio, for the multiplicative (Fibonacci) hashing
+_FIBONACCI = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class HashQTable(QTable):
+    """Sparse representation for integer states (e.g. the collapsed states of TGAgent)
+    when the state space is unknown or too big to be preallocated.
+
+    It is an open addressing hash map with linear probing: the keys are stored in one int64 array
+    and the Q values and the visit counts in parallel (capacity, n_actions) arrays.
+    When the load factor exceeds `max_load`, the capacity is doubled and the keys are reinserted
+    in a vectorized way, so the insertion cost is amortized constant.
+    Compared to the dictionary of arrays, the memory per state is of few tens of bytes
+    instead of a few hundreds."""
+
+    def __init__(self, n_actions:int, capacity=1024, max_load=0.7, dtype=np.float32, visits_dtype=np.int32):
+        """
+        :param capacity: initial number of slots. It is rounded to the next power of two.
+        :param max_load: the maximum ratio between used slots and capacity before resizing.
+        """
+        super().__init__(n_actions)
+        self.max_load = max_load
+        self.dtype = dtype
+        self.visits_dtype = visits_dtype
+        self.n_explored = 0
+
+        self._zeros = np.zeros(n_actions, dtype=dtype)
+        self._zeros.flags.writeable = False
+
+        self._allocate(1 << max(int(capacity) - 1, 1).bit_length())
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.n_used = 0
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._mask = capacity - 1
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.Q = np.zeros((capacity, self.n_actions), dtype=self.dtype)
+        self.Visits = np.zeros((capacity, self.n_actions), dtype=self.visits_dtype)
+        self.explored = np.zeros(capacity, dtype=np.bool_)
+
+    def _home(self, key):
+        return ((int(key) * _FIBONACCI) & _MASK64) >> self._shift
+
+    def _home_batch(self, keys):
+        return ((keys.astype(np.uint64) * np.uint64(_FIBONACCI)) >> np.uint64(self._shift)).astype(np.int64)
+
+    def _lookup(self, key):
+        """:returns the slot of `key`, or -1 if not present."""
+        keys = self.keys
+        i = self._home(key)
+        k = keys[i]
+        while k != key:
+            if k == EMPTY:
+                return -1
+            i = (i + 1) & self._mask
+            k = keys[i]
+        return i
+
+    def _lookup_batch(self, keys):
+        """:returns the array of the slots of `keys`, -1 for the ones not present."""
+        keys = np.asarray(keys, dtype=np.int64)
+        slots = self._home_batch(keys)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            found = self.keys[slots[pending]]
+            hit = found == keys[pending]
+            result[pending[hit]] = slots[pending[hit]]
+            pending = pending[~(hit | (found == EMPTY))]
+            slots[pending] = (slots[pending] + 1) & self._mask
+        return result
+
+    def _insert(self, key):
+        """:returns the slot of `key`, adding it if not present."""
+        keys = self.keys
+        i = self._home(key)
+        k = keys[i]
+        while k != key:
+            if k == EMPTY:
+                if self.n_used + 1 > self.max_load * self.capacity:
+                    self._resize(2 * self.capacity)
+                    return self._insert(key)
+                keys[i] = key
+                self.n_used += 1
+                return i
+            i = (i + 1) & self._mask
+            k = keys[i]
+        return i
+
+    def _resize(self, capacity):
+        used = self.keys != EMPTY
+        keys, Q, Visits, explored = self.keys[used], self.Q[used], self.Visits[used], self.explored[used]
+        self._allocate(capacity)
+
+        slots = self._home_batch(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            candidates = slots[pending]
+            free = self.keys[candidates] == EMPTY
+            # among the keys probing the same free slot, the first one takes it
+            taken, first = np.unique(candidates[free], return_index=True)
+            winners = pending[free][first]
+            self.keys[taken] = keys[winners]
+            self.Q[taken] = Q[winners]
+            self.Visits[taken] = Visits[winners]
+            self.explored[taken] = explored[winners]
+
+            placed = np.zeros(len(keys), dtype=np.bool_)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & self._mask
+
+        self.n_used = len(keys)
+
+    def __getitem__(self, state):
+        i = self._lookup(state)
+        return self._zeros if i < 0 else self.Q[i]
+
+    def get_rows(self, states):
+        slots = self._lookup_batch(states)
+        found = slots >= 0
+        rows = np.zeros((len(slots), self.n_actions), dtype=self.dtype)
+        rows[found] = self.Q[slots[found]]
+        return rows
+
+    def __contains__(self, state):
+        i = self._lookup(state)
+        return i >= 0 and bool(self.explored[i])
+
+    def __len__(self):
+        return self.n_explored
+
+    def update(self, state, action, delta):
+        i = self._insert(state)
+        if not self.explored[i]:
+            self.explored[i] = True
+            self.n_explored += 1
+        self.Q[i, action] += delta
+
+    def backup(self, state, action, target, alpha=None):
+        i = self._insert(state)
+        if not self.explored[i]:
+            self.explored[i] = True
+            self.n_explored += 1
+        kernels.td_backup(self.Q, self.Visits, i, action, target, alpha or 0.0)
+
+    def get_visits(self, state, action):
+        i = self._lookup(state)
+        return 0 if i < 0 else self.Visits[i, action]
+
+    def set_visits(self, state, action, value):
+        self.Visits[self._insert(state), action] = value
+
+    def inc_visits(self, state, action):
+        i = self._insert(state)
+        self.Visits[i, action] += 1
+        return self.Visits[i, action]
+
+    def remap(self, mapping, n_states=None, space=None):
+        used = np.flatnonzero(self.keys != EMPTY)
+        new_keys = mapping(self.keys[used])
+        merged = np.ones(len(used), dtype=np.bool_)
+        merged[self._survivors(self.keys[used], new_keys, self.Visits[used].sum(axis=1))] = False
+        self.keys[used] = new_keys
+        self.keys[used[merged]] = EMPTY
+        self.explored[used[merged]] = False
+        self.n_explored = int(np.count_nonzero(self.explored))
+        # the keys must be reinserted in their new home slots.
+        self._resize(self.capacity)
+
+    def greedy_policy(self):
+        return self.keys[self.explored], self._actions_array(np.argmax(self.Q[self.explored], axis=1))
+
+    def visits_row(self, state):
+        i = self._lookup(state)
+        return np.zeros(self.n_actions, dtype=self.visits_dtype) if i < 0 else self.Visits[i]
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+
+from rltg.agents.brains.qtables.DenseQTable import DenseQTable
+from rltg.agents.brains.qtables.QTable import QTable
+
+# the attributes backed by a file
+_MAPPED_FIELDS = ("Q", "Visits", "explored", "n_explored")
+
+
+class MemmapQTable(DenseQTable):
+    """Dense representation for a Discrete(n) observation space too big to fit in memory:
+    the matrices are numpy.memmap files in `directory` (usually the Trainer's agent_data_dir),
+    so the OS pages them in and out on demand.
+
+    The files are also the checkpoint of the table: pickling it only flushes the files and
+    saves their location, so RLAgent.save does not copy the table and RLAgent.load
+    (i.e. Trainer(resume=True)) just maps the files again.
+
+    The files are opened at the first access, after the Trainer has (possibly) cleaned
+    its agent_data_dir. A new table always creates them filled with zeros, overwriting the files
+    of an earlier run in the same directory: only a restored table reuses the existing files
+    (with the right size)."""
+
+    def __init__(self, n_states:int, n_actions:int, directory="agent_data", name="q_table",
+                 dtype=np.float32, visits_dtype=np.int32):
+        QTable.__init__(self, n_actions)
+        self.n_states = n_states
+        self.directory = directory
+        self.name = name
+        self.dtype = dtype
+        self.visits_dtype = visits_dtype
+        # True when the files hold the values of this table, e.g. after the unpickling.
+        self._reuse_files = False
+
+    def _path(self, field):
+        return os.path.join(self.directory, "%s.%s.mmap" % (self.name, field))
+
+    def _open_memmap(self, field, dtype, shape):
+        path = self._path(field)
+        size = np.dtype(dtype).itemsize * int(np.prod(shape))
+        reuse = self._reuse_files and os.path.exists(path) and os.path.getsize(path) == size
+        mode = "r+" if reuse else "w+"
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _fields(self, n_states):
+        """:returns the (field, dtype, shape) of the files, for a table of n_states states."""
+        return (("Q", self.dtype, (n_states, self.n_actions)),
+                ("Visits", self.visits_dtype, (n_states, self.n_actions)),
+                ("explored", np.bool_, (n_states,)))
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for field, dtype, shape in self._fields(self.n_states):
+            self.__dict__[field] = self._open_memmap(field, dtype, shape)
+        self._reuse_files = True
+        self.n_explored = int(np.count_nonzero(self.explored))
+
+    def __getattr__(self, item):
+        # called only when the attribute is missing, i.e. when the files are not opened yet.
+        if item in _MAPPED_FIELDS and "directory" in self.__dict__:
+            self._open()
+            return self.__dict__[item]
+        raise AttributeError(item)
+
+    def remap(self, mapping, n_states=None, space=None, chunk_size=2**16):
+        """The files are rewritten with the new size. The rows are copied in chunks of chunk_size states,
+        so that the table is never loaded in memory at once. The visits of the state kept so far for each
+        new state (see QTable.remap) are in a temporary file as well."""
+        n_states = self.n_states if n_states is None else n_states
+        new_fields = {field: np.memmap(self._path(field) + ".tmp", dtype=dtype, mode="w+", shape=shape)
+                      for field, dtype, shape in self._fields(n_states)}
+        kept_visits = np.memmap(self._path("kept_visits") + ".tmp", dtype=np.int64, mode="w+", shape=(n_states,))
+        kept_visits[:] = -1
+
+        for start in range(0, self.n_states, chunk_size):
+            old_states = np.arange(start, min(start + chunk_size, self.n_states))
+            new_states = mapping(old_states)
+            visits = self.Visits[old_states].sum(axis=1, dtype=np.int64)
+            survivors = self._survivors(old_states, new_states, visits)
+            # the states of the previous chunks are smaller: they are kept if tied.
+            survivors = survivors[visits[survivors] > kept_visits[new_states[survivors]]]
+            kept_visits[new_states[survivors]] = visits[survivors]
+            for field, new in new_fields.items():
+                new[new_states[survivors]] = getattr(self, field)[old_states[survivors]]
+
+        del kept_visits
+        os.remove(self._path("kept_visits") + ".tmp")
+        for field, new in new_fields.items():
+            new.flush()
+            self.__dict__.pop(field, None)
+            os.replace(self._path(field) + ".tmp", self._path(field))
+        del new_fields
+        self.n_states = n_states
+        # the new files are mapped at the next access.
+        self._reuse_files = True
+        self.__dict__.pop("n_explored", None)
+
+    def flush(self):
+        """Write the changes to disk."""
+        for field in _MAPPED_FIELDS[:-1]:
+            if field in self.__dict__:
+                self.__dict__[field].flush()
+
+    def __getstate__(self):
+        self.flush()
+        return {k: v for k, v in self.__dict__.items() if k not in _MAPPED_FIELDS}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reuse_files = True
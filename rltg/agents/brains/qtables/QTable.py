@@ -0,0 +1,159 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class QTable(ABC):
+    """Storage for the action values Q(s, a) and the visit counts N(s, a) used by the TDBrain.
+
+    The rows returned by __getitem__ are meant to be read only: every write must go through
+    the `update` and the visits methods, so that each backend can manage its own memory."""
+
+    def __init__(self, n_actions:int):
+        self.n_actions = n_actions
+
+    @abstractmethod
+    def __getitem__(self, state):
+        """:returns the array of the Q values of `state`, one for each action (zeros if `state` is unknown)."""
+        raise NotImplementedError
+
+    def get_rows(self, states):
+        """:returns the (len(states), n_actions) matrix of the Q values of `states` (zeros for the unknown ones)."""
+        return np.array([self[s] for s in states]).reshape(len(states), self.n_actions)
+
+    @abstractmethod
+    def __contains__(self, state):
+        """:returns True if a Q value of `state` has been updated at least once."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self):
+        """:returns the number of explored states, i.e. the states with a Q value."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, state, action, delta):
+        """Q(state, action) += delta"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_visits(self, state, action):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_visits(self, state, action, value):
+        raise NotImplementedError
+
+    @abstractmethod
+    def visits_row(self, state):
+        """:returns the array of the visit counts of `state`, one for each action."""
+        raise NotImplementedError
+
+    def greedy_policy(self):
+        """See Brain.greedy_policy. The actions are stored in the smallest unsigned integer type."""
+        raise NotImplementedError
+
+    def remap(self, mapping, n_states=None, space=None):
+        """Change the keys of the (integer) states, e.g. when the state space of TGAgent grows.
+        :param mapping:  a function from an array of old states to the array of the new ones. When several states
+                         are mapped to the same one (e.g. merged automaton states), the Q values and the visits
+                         of the one with the most visits are kept (of the smallest old state, if tied).
+        :param n_states: the size of the new state space, for the representations which need it.
+        :param space:    the new Tuple space of the states, for the representations which need it.
+        :raises NotImplementedError if the representation does not support it."""
+        raise NotImplementedError("{} does not support remapping the states".format(type(self).__name__))
+
+    def can_remap(self, components):
+        """:param components: the indexes of the components of the Tuple space of the states which may change.
+        :returns True if remap supports the changes of these components."""
+        return type(self).remap is not QTable.remap
+
+    @staticmethod
+    def _survivors(old_states, new_states, visits):
+        """:returns the indexes of the states kept by remap: among the ones with the same new state,
+        the one with the most visits, or the smallest old state if tied (see remap)."""
+        order = np.lexsort((old_states, -np.asarray(visits, dtype=np.float64)))
+        _, first = np.unique(new_states[order], return_index=True)
+        return order[first]
+
+    def _actions_array(self, actions):
+        return np.asarray(actions).astype(np.min_scalar_type(self.n_actions - 1))
+
+    def inc_visits(self, state, action):
+        """Increment the visit count of (state, action) and return the new count."""
+        visits = self.get_visits(state, action) + 1
+        self.set_visits(state, action, visits)
+        return visits
+
+    def backup(self, state, action, target, alpha=None):
+        """Q(state, action) += alpha * (target - Q(state, action)).
+        If alpha is None, alpha = 1/N(state, action), after incrementing the visit count N(state, action)."""
+        delta = target - self[state][action]
+        if not alpha:
+            alpha = 1.0 / self.inc_visits(state, action)
+        self.update(state, action, alpha * delta)
+
+
+class DictQTable(QTable):
+    """Sparse representation: a dictionary from states to arrays of Q values.
+    Works with every hashable state, so it can be used when the observation space is not known."""
+
+    def __init__(self, n_actions:int):
+        super().__init__(n_actions)
+        self.Q = {}
+        self.Visits = {}
+
+        # shared row for the unknown states, so that reading them does not allocate anything.
+        self._zeros = np.zeros(n_actions)
+        self._zeros.flags.writeable = False
+
+    def __getitem__(self, state):
+        return self.Q.get(state, self._zeros)
+
+    def __contains__(self, state):
+        return state in self.Q
+
+    def __len__(self):
+        return len(self.Q)
+
+    def update(self, state, action, delta):
+        row = self.Q.get(state)
+        if row is None:
+            row = self.Q[state] = np.zeros(self.n_actions)
+        row[action] += delta
+
+    def get_visits(self, state, action):
+        row = self.Visits.get(state)
+        return 0 if row is None else row[action]
+
+    def set_visits(self, state, action, value):
+        row = self.Visits.get(state)
+        if row is None:
+            row = self.Visits[state] = np.zeros(self.n_actions)
+        row[action] = value
+
+    def visits_row(self, state):
+        return self.Visits.get(state, self._zeros)
+
+    def remap(self, mapping, n_states=None, space=None):
+        # the Q values and the visits of a state move together, also when they are merged.
+        old_states = list(self.Q.keys() | self.Visits.keys())
+        if not old_states:
+            return
+        old_array = np.array(old_states)
+        new_states = mapping(old_array)
+        visits = [self.Visits[s].sum() if s in self.Visits else 0 for s in old_states]
+        survivors = self._survivors(old_array, new_states, visits)
+
+        Q, Visits = {}, {}
+        for i, new_state in zip(survivors.tolist(), new_states[survivors].tolist()):
+            old_state = old_states[i]
+            if old_state in self.Q:
+                Q[new_state] = self.Q[old_state]
+            if old_state in self.Visits:
+                Visits[new_state] = self.Visits[old_state]
+        self.Q, self.Visits = Q, Visits
+
+    def greedy_policy(self):
+        states = list(self.Q.keys())
+        return states, self._actions_array([np.argmax(self.Q[s]) for s in states])
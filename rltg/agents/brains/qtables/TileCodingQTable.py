@@ -0,0 +1,198 @@
+import functools
+import operator
+
+import numpy as np
+from gym.spaces import Tuple, Discrete
+
+from rltg.agents.brains.qtables.QTable import QTable
+from rltg.agents.feature_extraction import TupleFeatureExtractor
+
+
+class TileCodingQTable(QTable):
+    """Linear function approximation of Q with tile coding, over a Tuple of Discrete features.
+
+    Q(s, a) is the sum of the weights of the active tiles of s, one for each of the `n_tilings` tilings.
+    Every tiling partitions the tiled components in tiles of `tile_width` values, displaced by a fraction
+    of the width from the other tilings, so that close states share most of their tiles and the values
+    generalize across them. The memory is fixed: (number of tiles, n_actions) weights, optionally hashed
+    into `max_size` rows.
+
+    The components listed in `one_hot` (e.g. the automata states of TGAgent, i.e. the last components of its
+    feature space) are not tiled: their one-hot encoding selects a separate set of tiles, so that the same
+    robot features can have different values in different automata states.
+
+    The states can be either tuples of the space or integers collapsed by a TupleFeatureExtractor
+    of the same space (as in TGAgent). Updates on a state spread `delta` over its active tiles, so that Q(s, a)
+    changes exactly by `delta` (as in the tabular case) and every TDBrain can use this table unchanged.
+    The visit count of (s, a) is the one of its least visited tile."""
+
+    def __init__(self, space:Tuple, n_actions:int, n_tilings=8, tile_width=8, one_hot=(), max_size=None,
+                 dtype=np.float64, visits_dtype=np.int32):
+        """
+        :param space:      the Tuple of Discrete observation space.
+        :param n_tilings:  the number of tilings, i.e. the number of active tiles for each state.
+        :param tile_width: the width of the tiles, for all the tiled components or one for each of them.
+        :param one_hot:    the indexes of the components of `space` to not tile but encode as one-hot.
+        :param max_size:   if not None, the maximum number of rows of the weight matrix.
+                           If there are more tiles, they are hashed into `max_size` rows.
+        """
+        assert isinstance(space, Tuple) and all(isinstance(s, Discrete) for s in space.spaces)
+        super().__init__(n_actions)
+        self.space = space
+        self.n_tilings = n_tilings
+        self.max_size = max_size
+
+        sizes = np.array([s.n for s in space.spaces], dtype=np.int64)
+        self._sizes = sizes
+
+        # strides of the collapsed integer states, in the order used by TupleFeatureExtractor
+        self._strides = TupleFeatureExtractor(space).strides
+
+        self.one_hot = np.array(sorted(one_hot), dtype=np.int64)
+        self.tiled = np.array([i for i in range(len(sizes)) if i not in set(one_hot)], dtype=np.int64)
+
+        widths = np.broadcast_to(np.asarray(tile_width, dtype=np.float64), (len(self.tiled),)).copy()
+        self._widths = widths
+        tiles_per_dim = np.ceil(sizes[self.tiled] / widths).astype(np.int64) + 1
+        self._tile_strides = np.cumprod(np.concatenate([[1], tiles_per_dim[:-1]])).astype(np.int64)
+        tiles_per_tiling = int(np.prod(tiles_per_dim))
+
+        # asymmetric displacement of the tilings: the tiling t is shifted by t*(1, 3, 5, ...)/n_tilings tile widths
+        displacements = np.arange(n_tilings)[:, None] * (2 * np.arange(len(self.tiled)) + 1)[None, :]
+        self._offsets = (displacements / n_tilings % 1.0) * widths
+        self._tiling_base = np.arange(n_tilings, dtype=np.int64) * tiles_per_tiling
+
+        one_hot_sizes = sizes[self.one_hot]
+        self._one_hot_strides = np.cumprod(np.concatenate([[1], one_hot_sizes[:-1]])).astype(np.int64)
+        self._block_size = n_tilings * tiles_per_tiling
+        n_features = functools.reduce(operator.mul, one_hot_sizes.tolist(), 1) * self._block_size
+
+        self.hashed = max_size is not None and n_features > max_size
+        self.n_features = max_size if self.hashed else n_features
+
+        self.W = np.zeros((self.n_features, n_actions), dtype=dtype)
+        self.Visits = np.zeros((self.n_features, n_actions), dtype=visits_dtype)
+        self.explored = np.zeros(self.n_features, dtype=np.bool_)
+        self.n_explored = 0
+
+        # the same state is usually read and updated many times in a row
+        self._last_state = None
+        self._last_features = None
+
+    def _decode(self, state):
+        if isinstance(state, tuple):
+            return np.asarray(state, dtype=np.int64)
+        return (state // self._strides) % self._sizes
+
+    def _decode_batch(self, states):
+        states = np.asarray(states, dtype=np.int64)
+        if states.ndim == 2:
+            # already an array of tuples
+            return states
+        return (states[:, None] // self._strides) % self._sizes
+
+    def _features(self, x):
+        """:param x: a decoded state, or a (batch, n_components) matrix of decoded states."""
+        coords = np.floor((x[..., None, self.tiled] + self._offsets) / self._widths).astype(np.int64)
+        features = coords.dot(self._tile_strides) + self._tiling_base
+        if len(self.one_hot) > 0:
+            features += x[..., None, self.one_hot].dot(self._one_hot_strides) * self._block_size
+        if self.hashed:
+            features %= self.n_features
+        return features
+
+    def features(self, state):
+        """:returns the indexes of the active tiles of `state`, one for each tiling."""
+        if self._last_features is not None and state == self._last_state:
+            return self._last_features
+
+        features = self._features(self._decode(state))
+        self._last_state, self._last_features = state, features
+        return features
+
+    def get_rows(self, states):
+        return self.W[self._features(self._decode_batch(states))].sum(axis=1)
+
+    def __getitem__(self, state):
+        return self.W[self.features(state)].sum(axis=0)
+
+    def greedy_policy(self, batch_size=2**16):
+        """Flat greedy policy over all the (collapsed) states of the space, computed in batches."""
+        n_states = int(np.prod(self._sizes))
+        actions = np.empty(n_states, dtype=np.min_scalar_type(self.n_actions - 1))
+        for start in range(0, n_states, batch_size):
+            states = np.arange(start, min(start + batch_size, n_states))
+            actions[start:start + len(states)] = np.argmax(self.get_rows(states), axis=1)
+        return None, actions
+
+    def __contains__(self, state):
+        return bool(self.explored[self.features(state)].any())
+
+    def __len__(self):
+        """:returns the number of tiles updated at least once."""
+        return self.n_explored
+
+    def update(self, state, action, delta):
+        features = self.features(state)
+        np.add.at(self.W[:, action], features, delta / self.n_tilings)
+
+        new = features[~self.explored[features]]
+        if len(new) > 0:
+            new = np.unique(new)
+            self.explored[new] = True
+            self.n_explored += len(new)
+
+    def get_visits(self, state, action):
+        return self.Visits[self.features(state), action].min()
+
+    def set_visits(self, state, action, value):
+        self.Visits[self.features(state), action] = value
+
+    def inc_visits(self, state, action):
+        features = self.features(state)
+        np.add.at(self.Visits[:, action], features, 1)
+        return self.Visits[features, action].min()
+
+    def visits_row(self, state):
+        return self.Visits[self.features(state)].min(axis=0)
+
+    def can_remap(self, components):
+        return not self.hashed and set(components) <= set(self.one_hot.tolist())
+
+    def remap(self, mapping, n_states=None, space=None):
+        """Only the one-hot components can change (e.g. the automata states of TGAgent): the set of tiles
+        of each combination of their values is moved to the new combination, i.e. the one of the new state
+        of a state with those values (and the tiled components at 0). The states are integers.
+        :param space: the new Tuple space. The sizes of the tiled components must be the same.
+        :raises NotImplementedError if some tiled component changes, or if the tiles are hashed."""
+        assert space is not None, "the new space of the states is needed"
+        new_sizes = np.array([s.n for s in space.spaces], dtype=np.int64)
+        if self.hashed or len(new_sizes) != len(self._sizes) \
+                or np.any(new_sizes[self.tiled] != self._sizes[self.tiled]):
+            raise NotImplementedError("{} can remap only the one-hot components, without hashing"
+                                      .format(type(self).__name__))
+
+        new = TileCodingQTable(space, self.n_actions, self.n_tilings, self._widths, self.one_hot.tolist(),
+                               getattr(self, "max_size", None), self.W.dtype, self.Visits.dtype)
+        if new.hashed:
+            raise NotImplementedError("{} can remap only the one-hot components, without hashing"
+                                      .format(type(self).__name__))
+
+        # one representative state for each combination of the one-hot values
+        one_hot_sizes = self._sizes[self.one_hot]
+        old_blocks = np.arange(int(np.prod(one_hot_sizes)), dtype=np.int64)
+        x = np.zeros((len(old_blocks), len(self._sizes)), dtype=np.int64)
+        x[:, self.one_hot] = (old_blocks[:, None] // self._one_hot_strides) % one_hot_sizes
+        new_x = new._decode_batch(mapping(x.dot(self._strides)))
+        new_blocks = new_x[:, self.one_hot].dot(new._one_hot_strides)
+
+        size = self._block_size
+        visits = self.Visits.reshape(len(old_blocks), -1).sum(axis=1)
+        for b in self._survivors(old_blocks, new_blocks, visits).tolist():
+            old_rows = slice(b * size, (b + 1) * size)
+            new_rows = slice(new_blocks[b] * size, (new_blocks[b] + 1) * size)
+            new.W[new_rows] = self.W[old_rows]
+            new.Visits[new_rows] = self.Visits[old_rows]
+            new.explored[new_rows] = self.explored[old_rows]
+        new.n_explored = int(np.count_nonzero(new.explored))
+        self.__dict__.update(new.__dict__)
@@ -3,26 +3,200 @@ import operator
 import typing
 from abc import ABC, abstractmethod
 
+import numpy as np
 from gym import Space
-from gym.spaces import Tuple, Discrete
+from gym.spaces import Tuple, Discrete, Box, Dict
+
+# validation levels of the FeatureExtractor (see FeatureExtractor.set_validation)
+VALIDATION_FULL = "full"        # check every call
+VALIDATION_SAMPLED = "sampled"  # check one call every N
+VALIDATION_FIRST = "first"      # check only the first N calls
+VALIDATION_OFF = "off"          # never check
+VALIDATION_LEVELS = (VALIDATION_FULL, VALIDATION_SAMPLED, VALIDATION_FIRST, VALIDATION_OFF)
+
+
+def _is_integer(x):
+    # same rule of gym's Discrete.contains
+    return isinstance(x, int) or (isinstance(x, (np.generic, np.ndarray))
+                                  and x.dtype.kind in np.typecodes['AllInteger'] and x.shape == ())
+
+
+class _DiscreteChecker(object):
+    def __init__(self, space:Discrete):
+        self.n = space.n
+
+    def __call__(self, x):
+        if type(x) is int:
+            return 0 <= x < self.n
+        return _is_integer(x) and 0 <= x < self.n
+
+
+class _TupleOfDiscreteChecker(object):
+    def __init__(self, space:Tuple):
+        self.ns = tuple(s.n for s in space.spaces)
+
+    def __call__(self, x):
+        if isinstance(x, list):
+            x = tuple(x)
+        if not isinstance(x, tuple) or len(x) != len(self.ns):
+            return False
+        for part, n in zip(x, self.ns):
+            if type(part) is int:
+                if not 0 <= part < n:
+                    return False
+            elif not (_is_integer(part) and 0 <= part < n):
+                return False
+        return True
+
+
+class _TupleChecker(object):
+    def __init__(self, space:Tuple):
+        self.checkers = tuple(compile_checker(s) for s in space.spaces)
+
+    def __call__(self, x):
+        if isinstance(x, list):
+            x = tuple(x)
+        return isinstance(x, tuple) and len(x) == len(self.checkers) \
+               and all(check(part) for check, part in zip(self.checkers, x))
+
+
+class _BoxChecker(object):
+    def __init__(self, space:Box):
+        self.shape = space.shape
+        self.low, self.high = space.low, space.high
+        # with uniform bounds, compare only the extremes of the input
+        self.uniform = self.low.size > 0 and bool(np.all(self.low == self.low.flat[0])) \
+                       and bool(np.all(self.high == self.high.flat[0]))
+        if self.uniform:
+            self.low, self.high = float(self.low.flat[0]), float(self.high.flat[0])
+        # for one-byte integer inputs (e.g. uint8 matrices), the allowed byte values, by dtype
+        self._allowed_bytes = {}
+
+    def _bytes_table(self, dtype):
+        table = self._allowed_bytes.get(dtype)
+        if table is None:
+            info = np.iinfo(dtype)
+            values = np.arange(max(np.ceil(self.low), info.min), min(np.floor(self.high), info.max) + 1)
+            table = self._allowed_bytes[dtype] = values.astype(dtype).tobytes()
+        return table
+
+    def __call__(self, x):
+        if getattr(x, "shape", None) != self.shape:
+            return False
+        if self.uniform:
+            if x.dtype.itemsize == 1 and x.dtype.kind in "ui":
+                # delete the allowed bytes: nothing has to remain
+                return len(x.tobytes().translate(None, self._bytes_table(x.dtype))) == 0
+            return x.size == 0 or (x.min() >= self.low and x.max() <= self.high)
+        return bool((x >= self.low).all() and (x <= self.high).all())
+
+
+class _DictChecker(object):
+    def __init__(self, space:Dict):
+        self.checkers = tuple((k, compile_checker(s)) for k, s in space.spaces.items())
+
+    def __call__(self, x):
+        if not isinstance(x, dict) or len(x) != len(self.checkers):
+            return False
+        for k, check in self.checkers:
+            if k not in x or not check(x[k]):
+                return False
+        return True
+
+
+class _SpaceChecker(object):
+    def __init__(self, space:Space):
+        self.space = space
+
+    def __call__(self, x):
+        return self.space.contains(x)
+
+
+def compile_checker(space:Space):
+    """Build a fast membership test for `space`, equivalent to `space.contains`.
+    Tuple (in particular of Discrete), Dict, Box and Discrete spaces have specialized checkers,
+    that precompute what they need and avoid the generic gym overhead;
+    the other spaces fall back on `space.contains`."""
+    if isinstance(space, Discrete):
+        return _DiscreteChecker(space)
+    elif isinstance(space, Tuple) and all(isinstance(s, Discrete) for s in space.spaces):
+        return _TupleOfDiscreteChecker(space)
+    elif isinstance(space, Tuple):
+        return _TupleChecker(space)
+    elif isinstance(space, Box):
+        return _BoxChecker(space)
+    elif isinstance(space, Dict):
+        return _DictChecker(space)
+    else:
+        return _SpaceChecker(space)
 
 
 class FeatureExtractor(ABC):
 
+    # default validation level of every feature extractor, see set_validation.
+    validation = VALIDATION_FULL
+    validation_n = 1
+
     def __init__(self, input_space: Space, output_space: Space):
         self.input_space = input_space
         self.output_space = output_space
+        self._compile_checkers()
+
+    def _compile_checkers(self):
+        self._n_calls = 0
+        self._check_input = compile_checker(self.input_space)
+        self._check_output = compile_checker(self.output_space)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "_check_input" not in state:
+            self._compile_checkers()
+
+    def set_validation(self, level=VALIDATION_FULL, n=1):
+        """Set how often the input and the output of this extractor are validated.
+        :param level: VALIDATION_FULL:    check every call (default, useful for debugging);
+                      VALIDATION_SAMPLED: check one call every n;
+                      VALIDATION_FIRST:   check only the first n calls;
+                      VALIDATION_OFF:     never check (production runs).
+        :raises ValueError if the level is unknown."""
+        if level not in VALIDATION_LEVELS:
+            raise ValueError("unknown validation level: {}. Choose among {}.".format(level, VALIDATION_LEVELS))
+        self.validation = level
+        self.validation_n = n
+        self._n_calls = 0
+
+    @staticmethod
+    def set_default_validation(level=VALIDATION_FULL, n=1):
+        """Like set_validation, but for all the extractors without a level set explicitly."""
+        if level not in VALIDATION_LEVELS:
+            raise ValueError("unknown validation level: {}. Choose among {}.".format(level, VALIDATION_LEVELS))
+        FeatureExtractor.validation = level
+        FeatureExtractor.validation_n = n
+
+    def _must_validate(self):
+        level = self.validation
+        if level == VALIDATION_FULL:
+            return True
+        elif level == VALIDATION_OFF:
+            return False
+        self._n_calls += 1
+        if level == VALIDATION_SAMPLED:
+            return (self._n_calls - 1) % self.validation_n == 0
+        else:
+            return self._n_calls <= self.validation_n
 
     def __call__(self, input, **kwargs):
         """Extract features from the input and make sanity check
-        of the input and the output dimensions of the abstract method '_extract'"""
+        of the input and the output dimensions of the abstract method '_extract'
+        (see set_validation for how often)."""
+        validate = self._must_validate()
 
-        if not self.input_space.contains(input):
+        if validate and not self._check_input(input):
             raise ValueError("input space dimensions are not correct.")
 
         output = self._extract(input, **kwargs)
 
-        if not self.output_space.contains(output):
+        if validate and not self._check_output(output):
             raise ValueError("output space dimensions are not correct.")
 
         return output
@@ -80,6 +254,16 @@ class TupleFeatureExtractor(FeatureExtractor):
         # sort subspaces from the biggest to the smaller, keeping its component id in the input space
         self.id2space_sorted = sorted(enumerate(space.spaces), key=lambda x: -x[1].n)
 
+        # mixed radix representation: the component ids and their dimensions in the collapsing order,
+        # and the stride (i.e. the weight in the collapsed integer) of each component of the input.
+        self._order = np.array([id for id, _ in self.id2space_sorted], dtype=np.int64)
+        self._dims = tuple(s.n for _, s in self.id2space_sorted)
+        self.strides = np.zeros(len(space.spaces), dtype=np.int64)
+        stride = 1
+        for id, s in reversed(self.id2space_sorted):
+            self.strides[id] = stride
+            stride *= s.n
+
         super().__init__(space, Discrete(tot_dim))
 
 
@@ -99,3 +283,58 @@ class TupleFeatureExtractor(FeatureExtractor):
 
         return state
 
+    def encode_batch(self, inputs):
+        """Vectorized version of the extraction, without validation.
+        :param inputs: a (batch, number of components) array of tuples contained in the input space.
+        :returns the array of the collapsed integers, the same of calling the extractor on every tuple.
+        :raises ValueError if some component is out of its range."""
+        inputs = np.asarray(inputs, dtype=np.int64).reshape(-1, len(self._dims))
+        return np.ravel_multi_index(tuple(inputs[:, self._order].T), self._dims)
+
+    def decode_batch(self, states):
+        """The inverse of encode_batch.
+        :param states: an array of integers contained in the output space.
+        :returns the (batch, number of components) array of the corresponding tuples.
+        :raises ValueError if some integer is out of the output space."""
+        sorted_components = np.unravel_index(np.asarray(states, dtype=np.int64).ravel(), self._dims)
+        result = np.empty((len(sorted_components[0]), len(self._dims)), dtype=np.int64)
+        result[:, self._order] = np.stack(sorted_components, axis=1)
+        return result
+
+
+class TupleStateEncoder(object):
+    """Fused version of a TupleFeatureExtractor over the space (features..., automata states...) of TGAgent.
+
+    The mixed radix strides are precomputed, so the collapsed state is computed directly as
+    encode_features(features) + encode_automata(automata_states), without building the concatenated tuple.
+    Since the two parts are independent, the code of the features can be kept while only the automata
+    states change, e.g. the same observation seen before and after an update of the automata."""
+
+    def __init__(self, extractor:TupleFeatureExtractor, n_features:int):
+        """
+        :param extractor:  the extractor of the whole tuple (features..., automata states...).
+        :param n_features: the number of components of the features, i.e. of the robot feature space.
+        """
+        self.extractor = extractor
+        strides = [int(s) for s in extractor.strides]
+        self.feature_strides = tuple(strides[:n_features])
+        self.automata_strides = tuple(strides[n_features:])
+        self.automata_sizes = tuple(s.n for s in extractor.input_space.spaces[n_features:])
+
+    def encode_features(self, features):
+        """:returns the contribution of the features to the collapsed state."""
+        return sum(map(operator.mul, features, self.feature_strides))
+
+    def encode_automata(self, automata_states):
+        """:returns the contribution of the automata states to the collapsed state.
+        They are validated according to the validation level of the extractor.
+        :raises ValueError if some automaton state is out of its state space."""
+        if self.extractor._must_validate():
+            if len(automata_states) != len(self.automata_sizes) \
+                    or not all(_is_integer(s) and 0 <= s < n for s, n in zip(automata_states, self.automata_sizes)):
+                raise ValueError("automata states are not in their state spaces: {}".format(automata_states))
+        return sum(map(operator.mul, automata_states, self.automata_strides))
+
+    def encode(self, features, automata_states):
+        """:returns the same of extractor(features + tuple(automata_states))."""
+        return self.encode_features(features) + self.encode_automata(automata_states)
@@ -0,0 +1,55 @@
+from typing import List
+
+from gym.spaces import Discrete
+
+from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
+from rltg.logic.ProductAutomatonSimulator import ProductAutomatonSimulator
+
+
+class ProductTemporalEvaluator(object):
+    """Evaluate several temporal goals at once, through the product of their automata.
+
+    It has the interface of a TemporalEvaluator (update, get_state, get_state_space, reset, is_failed, simulator),
+    but the state is the id of the reachable product state, the reward is the sum of the rewards of the goals,
+    and it is failed when any of the goals is failed. Every step labels the observation with each evaluator,
+    and then makes one transition of the product automaton."""
+
+    def __init__(self, temporal_evaluators:List[TemporalEvaluator]):
+        """
+        :param temporal_evaluators: the evaluators of the goals. They must be compiled (not on the fly).
+        :raises ValueError if some evaluator is on the fly.
+        """
+        if any(te.on_the_fly for te in temporal_evaluators):
+            raise ValueError("the product of the automata needs compiled temporal evaluators, not on the fly ones.")
+        self.temporal_evaluators = list(temporal_evaluators)
+        self.on_the_fly = False
+        self.simulator = ProductAutomatonSimulator([te.simulator for te in self.temporal_evaluators])
+
+    def update(self, state):
+        """update the automaton.
+        :returns (new_automaton_state, reward)"""
+        label = 0
+        for te, shift in zip(self.temporal_evaluators, self.simulator.shifts):
+            label |= te.fromFeaturesToBitmask(te.goal_feature_extractor(state)) << shift
+        reward = self.simulator.make_transition_bitmask(label)
+        return self.simulator.get_cur_state(), reward
+
+    def get_state(self):
+        return self.simulator.get_cur_state()
+
+    def swap_compiled(self):
+        # the automata are always compiled.
+        return None
+
+    def get_state_space(self):
+        return Discrete(len(self.simulator.id2components))
+
+    def reset(self):
+        self.simulator.reset()
+
+    def close(self):
+        for te in self.temporal_evaluators:
+            te.close()
+
+    def is_failed(self):
+        return self.simulator.is_failed()
@@ -1,4 +1,7 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+from collections import deque
+
+import numpy as np
 
 from flloat.base.Alphabet import Alphabet
 from flloat.syntax.ldlf import LDLfFormula
@@ -8,52 +11,181 @@ from pythomata.base.Symbol import Symbol
 from typing import Set
 
 from rltg.agents.feature_extraction import FeatureExtractor
+from rltg.logic.AutomatonCache import AutomatonCache
+from rltg.logic.AutomatonCompiler import AutomatonCompiler
 from rltg.logic.PartialAutomatonSimulator import PartialAutomatonSimulator
 from rltg.logic.RewardAutomaton import RewardAutomaton
 from rltg.logic.RewardAutomatonSimulator import RewardAutomatonSimulator
 
 
 class TemporalEvaluator(ABC):
+    """Evaluate a temporal goal over the observations, through the automaton of its formula.
+
+    The subclasses label the observations by implementing (at least) one of:
+    - fromFeaturesToPropositional: returns the frozenset of the true symbols;
+    - fromFeaturesToBitmask:       returns an int, whose bit i is set iff the symbol self.symbols[i] is true
+                                   (see symbol2bit), e.g. computed with one vectorized NumPy expression.
+    The other one is derived automatically."""
+
     def __init__(self, goal_feature_extractor:FeatureExtractor, alphabet:Set[Symbol], formula:LDLfFormula, reward,
-                 gamma=0.99, on_the_fly=False):
+                 gamma=0.99, on_the_fly=False, automaton_cache:AutomatonCache=None, compile_timeout:float=None,
+                 max_states:int=None):
+        """
+        :param alphabet:        the symbols of the formula. If it is a list (or a tuple), its order is the order
+                                of the bits in the labels, otherwise the symbols are sorted by name.
+        :param automaton_cache: the cache of the compiled automata (not used on the fly).
+                                By default, the one of AutomatonCache.set_default_directory, if any.
+        :param compile_timeout: if not None, the automaton is compiled in a worker process, waiting at most
+                                this number of seconds. If exceeded, the evaluator starts on the fly, and the
+                                compiled automaton replaces the on the fly one when ready (see swap_compiled).
+                                An evaluator saved before then compiles again when loaded.
+        :param max_states:      if not None, a compiled automaton with more states is discarded, and the evaluator
+                                stays on the fly. As compile_timeout, it compiles in a worker process.
+        """
         self.goal_feature_extractor = goal_feature_extractor
+        self.symbols = list(alphabet) if isinstance(alphabet, (list, tuple)) else sorted(alphabet, key=str)
+        self.symbol2bit = {sym: 1 << i for i, sym in enumerate(self.symbols)}
+        self._check_labelling()
+        alphabet = set(self.symbols)
         self.alphabet = Alphabet(alphabet)
         self.formula = formula
+        # the compilation running in background, if any (see swap_compiled)
+        self._compiler = None
+        cache = automaton_cache if automaton_cache is not None else AutomatonCache.default()
+
+        if not on_the_fly and (compile_timeout is not None or max_states is not None):
+            compiler = AutomatonCompiler(formula, self.symbols, reward, gamma, cache, max_states)
+            if compiler.poll(compile_timeout):
+                on_the_fly = compiler.dfa is None
+                if not on_the_fly:
+                    self._set_automaton(RewardAutomaton(compiler.dfa, compiler.dfa.alphabet, formula, reward, gamma))
+            else:
+                on_the_fly = True
+                self._compiler = compiler
+        elif not on_the_fly:
+            self._set_automaton(RewardAutomaton._fromFormula(alphabet, formula, reward, gamma, cache))
+
         self.on_the_fly = on_the_fly
-        if not on_the_fly:
-            self._automaton = RewardAutomaton._fromFormula(alphabet, formula, reward, gamma)
-            self.simulator = RewardAutomatonSimulator(self._automaton)
-        else:
+        if on_the_fly:
             self.dfaotf = self.formula.to_automaton(alphabet, on_the_fly=True)
-            self.simulator = PartialAutomatonSimulator(self.dfaotf, self.alphabet, reward, gamma)
+            self.simulator = PartialAutomatonSimulator(self.dfaotf, self.alphabet, reward, gamma, self.symbols)
+
+    def _set_automaton(self, automaton:RewardAutomaton):
+        self._automaton = automaton
+        self.simulator = RewardAutomatonSimulator(self._automaton, self.symbols)
+
+    def _check_labelling(self):
+        cls = type(self)
+        self._bitmask_labels = cls.fromFeaturesToBitmask is not TemporalEvaluator.fromFeaturesToBitmask
+        if not self._bitmask_labels and \
+                cls.fromFeaturesToPropositional is TemporalEvaluator.fromFeaturesToPropositional:
+            raise TypeError("{} must implement fromFeaturesToPropositional or fromFeaturesToBitmask"
+                            .format(cls.__name__))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the worker process is not saved, but its parameters: the compilation starts again when loaded.
+        compiler = state.pop("_compiler", None)
+        if compiler is not None:
+            state["_compile_args"] = (compiler.reward, compiler.gamma, compiler.cache, compiler.max_states)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        compile_args = self.__dict__.pop("_compile_args", None)
+        # evaluators pickled before the bitmask labels.
+        if "symbols" not in state:
+            self.symbols = sorted(self.alphabet.symbols, key=str)
+            self.symbol2bit = {sym: 1 << i for i, sym in enumerate(self.symbols)}
+            self._check_labelling()
+        # the compilation was still running (or not swapped yet) when saved.
+        self._compiler = None
+        if compile_args is not None and self.on_the_fly:
+            self._compiler = AutomatonCompiler(self.formula, self.symbols, *compile_args)
 
-    @abstractmethod
     def fromFeaturesToPropositional(self, features) -> Set[Symbol]:
-        raise NotImplementedError
+        """:returns the frozenset of the symbols true in the goal features."""
+        return self.to_symbols(self.fromFeaturesToBitmask(features))
+
+    def fromFeaturesToBitmask(self, features) -> int:
+        """:returns the bitmask of the symbols true in the goal features."""
+        return self.to_bitmask(self.fromFeaturesToPropositional(features))
+
+    def to_bitmask(self, symbols:Set[Symbol]) -> int:
+        return self.simulator.to_bitmask(symbols)
+
+    def to_symbols(self, label:int) -> Set[Symbol]:
+        return self.simulator.to_symbols(label)
 
     def update(self, state):
         """update the automaton.
         :returns (new_automaton_state, reward)"""
         features = self.goal_feature_extractor(state)
-        propositional = self.fromFeaturesToPropositional(features)
-        reward = self.simulator.make_transition(propositional)
+        if self._bitmask_labels:
+            reward = self.simulator.make_transition_bitmask(self.fromFeaturesToBitmask(features))
+        else:
+            reward = self.simulator.make_transition(self.fromFeaturesToPropositional(features))
         return self.simulator.get_cur_state(), reward
 
     def get_state(self):
         return self.simulator.get_cur_state()
 
+    def swap_compiled(self):
+        """If the automaton compiled in background (see compile_timeout) is ready, use it instead of the on the fly
+        simulator. The current state is preserved: every discovered state is mapped to the state of the compiled
+        automaton reached by the same labels. Since the compiled automaton is minimal, many states may be
+        mapped to the same one.
+        :returns the array of the compiled state id of each on the fly state id (up to the on the fly capacity),
+                 or None if nothing has changed."""
+        if self._compiler is None or not self._compiler.poll():
+            return None
+        compiler, self._compiler = self._compiler, None
+        if compiler.dfa is None:
+            return None
+
+        partial = self.simulator
+        self._set_automaton(RewardAutomaton(compiler.dfa, compiler.dfa.alphabet, self.formula,
+                                            compiler.reward, compiler.gamma))
+        self.on_the_fly = False
+        del self.dfaotf
+
+        state_mapping = self._map_states(partial, self.simulator)
+        self.simulator.cur_state = state_mapping.item(partial.cur_state)
+        self.simulator.visited_states = {self.simulator.cur_state}
+        return state_mapping
+
+    @staticmethod
+    def _map_states(partial:PartialAutomatonSimulator, compiled:RewardAutomatonSimulator):
+        """A breadth first search of the discovered transitions, following the same labels in the compiled automaton."""
+        state_mapping = np.zeros(partial.capacity, dtype=np.int64)
+        state_mapping[partial.initial_state] = compiled.state2id[compiled.dfa.initial_state]
+        visited = {partial.initial_state}
+        queue = deque([partial.initial_state])
+        while queue:
+            s = queue.popleft()
+            for label, s_prime in partial.transition_function.get(s, {}).items():
+                if s_prime not in visited:
+                    visited.add(s_prime)
+                    state_mapping[s_prime] = compiled.transitions.item(state_mapping.item(s), label)
+                    queue.append(s_prime)
+        return state_mapping
+
     def get_state_space(self):
         if not self.on_the_fly:
             return Discrete(len(self.simulator.state2id))
         else:
-            # estimate the state space size.
-            # the estimate MUST overestimate the true size.
-            # TODO: do you really return a magic number?
-            return Discrete(100)
+            # the states are discovered while running: the space grows with them (see TGAgent.observe).
+            return Discrete(self.simulator.capacity)
 
 
     def reset(self):
         self.simulator.reset()
 
+    def close(self):
+        """Stop the compilation in background, if any: the evaluator stays on the fly."""
+        if self._compiler is not None:
+            self._compiler.cancel()
+            self._compiler = None
+
     def is_failed(self):
         return self.simulator.is_failed()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+from typing import List
+
+import numpy as np
+from flloat.base.Symbol import Symbol
+from flloat.semantics.pl import PLInterpretation
+from flloat.syntax.ldlf import LDLfFormula
+from pythomata.base.Alphabet import Alphabet
+from pythomata.base.DFA import DFA
+
+# version of the file format, part of the key
+_FORMAT_VERSION = 1
+
+
+class AutomatonCache(object):
+    """Persistent cache of the DFA of the LDLf formulas, i.e. of the result of
+    formula.to_automaton(alphabet, determinize=True, minimize=True), which can be very slow.
+
+    The entries are content addressed: the file name is the hash of the formula (in its string form),
+    of the names of the symbols and of the reward parameters. Each entry is a small .npz file with the
+    transition table of the DFA, indexed by [state id, label bitmask] (the bit i is set iff the i-th symbol,
+    sorted by name, is true), the initial state and the accepting flag of each state.
+    The reachability levels are not stored: they are recomputed in linear time by RewardAutomaton."""
+
+    # the directory used when no cache is given explicitly (see set_default_directory)
+    default_directory = os.environ.get("RLTG_AUTOMATA_CACHE")
+
+    def __init__(self, directory:str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def set_default_directory(directory:str=None):
+        """Set the cache used by the temporal evaluators without an explicit one. None disables it.
+        The initial value is the environment variable RLTG_AUTOMATA_CACHE."""
+        AutomatonCache.default_directory = directory
+
+    @staticmethod
+    def default():
+        """:returns the cache in the default directory, or None if not set."""
+        directory = AutomatonCache.default_directory
+        return AutomatonCache(directory) if directory else None
+
+    @staticmethod
+    def key(f:LDLfFormula, symbols:List[Symbol], reward, gamma):
+        description = "|".join([str(_FORMAT_VERSION), str(f), ",".join(sorted(map(str, symbols))),
+                                repr(reward), repr(gamma)])
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, f:LDLfFormula, symbols:List[Symbol], reward, gamma) -> DFA:
+        """:returns the cached DFA, or None if not present (or unreadable)."""
+        try:
+            with np.load(self.path(self.key(f, symbols, reward, gamma))) as data:
+                transitions, initial_state, accepting = data["transitions"], int(data["initial_state"]), \
+                                                        data["accepting"]
+        except (OSError, KeyError, ValueError):
+            return None
+        return self._to_dfa(sorted(symbols, key=str), transitions, initial_state, accepting)
+
+    def save(self, dfa:DFA, f:LDLfFormula, symbols:List[Symbol], reward, gamma):
+        transitions, initial_state, accepting = self._to_arrays(sorted(symbols, key=str), dfa)
+        # write and rename, so that concurrent processes never read a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                np.savez(fout, transitions=transitions, initial_state=initial_state, accepting=accepting)
+            os.replace(tmp_path, self.path(self.key(f, symbols, reward, gamma)))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get_or_compile(self, f:LDLfFormula, symbols:List[Symbol], reward, gamma) -> DFA:
+        """:returns the DFA of the formula, from the cache if present, otherwise compiling and caching it."""
+        dfa = self.load(f, symbols, reward, gamma)
+        if dfa is None:
+            dfa = f.to_automaton(set(symbols), determinize=True, minimize=True)
+            self.save(dfa, f, symbols, reward, gamma)
+        return dfa
+
+    @staticmethod
+    def _to_arrays(symbols, dfa:DFA):
+        symbol2bit = {sym: 1 << i for i, sym in enumerate(symbols)}
+        state2id = {s: i for i, s in enumerate(dfa.states)}
+
+        # -1 marks a missing transition
+        transitions = np.full((len(state2id), 1 << len(symbols)), -1, dtype=np.int32)
+        for s, i in state2id.items():
+            for interpretation, s_prime in dfa.transition_function.get(s, {}).items():
+                label = sum(symbol2bit[sym] for sym in interpretation.true_propositions)
+                transitions[i, label] = state2id[s_prime]
+
+        accepting = np.array([s in dfa.accepting_states for s in state2id])
+        return transitions, state2id[dfa.initial_state], accepting
+
+    @staticmethod
+    def _to_dfa(symbols, transitions, initial_state, accepting) -> DFA:
+        interpretations = [PLInterpretation({sym for i, sym in enumerate(symbols) if label >> i & 1})
+                           for label in range(transitions.shape[1])]
+        transition_function = {}
+        for s, row in enumerate(transitions.tolist()):
+            for label, s_prime in enumerate(row):
+                if s_prime >= 0:
+                    transition_function.setdefault(s, {})[interpretations[label]] = s_prime
+
+        return DFA(Alphabet(set(interpretations)), frozenset(range(len(transitions))), initial_state,
+                   frozenset(np.flatnonzero(accepting).tolist()), transition_function)
@@ -0,0 +1,95 @@
+import multiprocessing
+from typing import List
+
+from flloat.base.Symbol import Symbol
+from flloat.syntax.ldlf import LDLfFormula
+
+from rltg.logic.AutomatonCache import AutomatonCache
+
+
+def _compile(f:LDLfFormula, symbols:List[Symbol], reward, gamma, cache:AutomatonCache, max_states):
+    """:returns the arrays of the DFA (see AutomatonCache._to_arrays), or None if it has more than max_states states."""
+    if cache is None:
+        dfa = f.to_automaton(set(symbols), determinize=True, minimize=True)
+    else:
+        dfa = cache.get_or_compile(f, symbols, reward, gamma)
+
+    if max_states is not None and len(dfa.states) > max_states:
+        return None
+    return AutomatonCache._to_arrays(sorted(symbols, key=str), dfa)
+
+
+def _compile_worker(connection, *args):
+    """The body of the worker process: send the result of _compile."""
+    connection.send(_compile(*args))
+    connection.close()
+
+
+class AutomatonCompiler(object):
+    """Compile the DFA of a formula (as RewardAutomaton._fromFormula) in a worker process,
+    so that the caller can give up waiting, and collect the result later.
+
+    The DFA is sent back in the compact form of AutomatonCache (the transition table), and rebuilt
+    in this process. The determinization cannot be interrupted: the limit on the number of states is checked
+    on the result, which is discarded if too big.
+
+    A daemonic process (e.g. a worker of a multiprocessing.Pool) cannot start processes: there, the DFA is
+    compiled in the constructor, without time limit. A running compilation should be stopped with cancel()
+    when the result is no longer needed."""
+
+    def __init__(self, f:LDLfFormula, symbols:List[Symbol], reward, gamma=0.99, cache:AutomatonCache=None,
+                 max_states:int=None):
+        """
+        :param cache:      if not None, the worker takes the DFA from (or stores it into) the cache.
+        :param max_states: if not None, the maximum number of states of the DFA.
+        """
+        self.f = f
+        self.symbols = list(symbols)
+        self.reward = reward
+        self.gamma = gamma
+        self.cache = cache
+        self.max_states = max_states
+
+        # the DFA, when done. None if too big, or if the compilation has failed.
+        self.dfa = None
+        self.done = False
+
+        args = (f, self.symbols, reward, gamma, cache, max_states)
+        if multiprocessing.current_process().daemon:
+            self._finish(_compile(*args))
+            return
+
+        self._connection, worker_connection = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=_compile_worker, args=(worker_connection,) + args,
+                                                daemon=True)
+        self._process.start()
+        # otherwise the end of the worker would not be noticed.
+        worker_connection.close()
+
+    def _finish(self, arrays):
+        if arrays is not None:
+            self.dfa = AutomatonCache._to_dfa(sorted(self.symbols, key=str), *arrays)
+        self.done = True
+
+    def poll(self, timeout=0.0):
+        """Wait for the end of the compilation at most `timeout` seconds (None: without limit).
+        :returns True if the compilation has finished: then `dfa` is the DFA,
+                 or None if it has more than max_states states (or if the worker has failed)."""
+        if not self.done and self._connection.poll(timeout):
+            try:
+                arrays = self._connection.recv()
+            except EOFError:
+                # the worker has died without a result, e.g. because of an exception.
+                arrays = None
+            self._finish(arrays)
+            self._connection.close()
+            self._process.join()
+        return self.done
+
+    def cancel(self):
+        """Stop the compilation, if not done."""
+        if not self.done:
+            self._process.terminate()
+            self._process.join()
+            self._connection.close()
+            self.done = True
@@ -0,0 +1,65 @@
+import numpy as np
+
+from rltg.logic.RewardAutomatonSimulator import RewardSimulator
+
+
+class BatchAutomatonSimulator(object):
+    """Simulator of n copies of the same compiled automaton, e.g. one for each of n environments run side by side.
+
+    The current states are one array of state ids, and a step of all the copies is one lookup in the tables
+    of the compiled simulator (transitions, transition_rewards, accepting and failure), indexed by
+    [state id, label bitmask]. Works with RewardAutomatonSimulator and ProductAutomatonSimulator
+    (then the labels are the joint ones), not with the automata built on the fly."""
+
+    def __init__(self, simulator:RewardSimulator, n:int):
+        """
+        :param simulator: the compiled simulator of the automaton. Its current state is not used.
+        :param n:         the number of copies.
+        :raises ValueError if the simulator is not compiled.
+        """
+        if not hasattr(simulator, "transitions"):
+            raise ValueError("{} has no transition table: the batch simulator needs a compiled automaton."
+                             .format(type(simulator).__name__))
+        self.simulator = simulator
+        self.transitions = simulator.transitions
+        self.transition_rewards = simulator.transition_rewards
+        self.accepting = simulator.accepting
+        self.failure = simulator.failure
+        self.initial_state = simulator.initial_state
+
+        self.states = np.full(n, self.initial_state, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.states)
+
+    def reset(self, mask=None):
+        """Bring the copies back to the initial state.
+        :param mask: None (all the copies), or the boolean array (or the indexes) of the copies to reset."""
+        if mask is None:
+            self.states[:] = self.initial_state
+        else:
+            self.states[mask] = self.initial_state
+
+    def step(self, labels):
+        """Make one transition in every copy.
+        :param labels: the array of the label bitmasks, one for each copy.
+        :returns the arrays (next states, rewards, failed, accepting), one element for each copy.
+                 They are new arrays, not changed by the next steps.
+        :raises ValueError if some transition is missing. Then no copy is updated."""
+        labels = np.asarray(labels, dtype=np.int64)
+        next_states = self.transitions[self.states, labels]
+        if np.any(next_states < 0):
+            i = np.flatnonzero(next_states < 0)[0]
+            raise ValueError("no transition from state {} with label {}".format(self.states[i], labels[i]))
+        rewards = self.transition_rewards[self.states, labels]
+        self.states = next_states
+        return next_states.copy(), rewards, self.failure[next_states], self.accepting[next_states]
+
+    def get_cur_states(self):
+        return self.states.copy()
+
+    def is_true(self):
+        return self.accepting[self.states]
+
+    def is_failed(self):
+        return self.failure[self.states]
@@ -1,46 +1,107 @@
+from collections import deque
+
 from flloat.flloat import DFAOTF
-from typing import Set, List
+from typing import List
 
 from flloat.semantics.pl import PLInterpretation
-from flloat.utils import powerset
 from pythomata.base.Alphabet import Alphabet
-from pythomata.base.DFA import DFA
 from pythomata.base.Symbol import Symbol
 
-from rltg.logic.RewardAutomaton import RewardAutomaton
 from rltg.logic.RewardAutomatonSimulator import RewardSimulator
 
 
 class PartialAutomatonSimulator(RewardSimulator):
-
-    def __init__(self, dfaotf:DFAOTF, alphabet:Alphabet, reward, gamma=0.99):
-
+    """Simulator of the automaton of a formula built on the fly (DFAOTF).
+
+    The states and the transitions are discovered while simulating. The reward shaping of RewardAutomaton
+    is applied to the discovered graph: the reachability levels of the states (i.e. the length of the shortest
+    known path to a known final state) are updated in place, only when a new transition is discovered.
+
+    The discovered transitions are also a cache in front of the DFAOTF: a known (state id, label bitmask) pair
+    is answered by the transition table, and only the unseen ones are computed by flloat.
+    The labels are never enumerated: the alphabet is the set of symbols, not its powerset, so the cost
+    of the simulator does not depend exponentially on the number of symbols, but only on the discovered labels.
+    Hence, once the reachable part of the automaton is discovered, a step costs as in a DFA.
+    The DFAOTF is used only on the cache misses, so its current state is not kept up to date."""
+
+    def __init__(self, dfaotf:DFAOTF, alphabet:Alphabet, reward, gamma=0.99, symbols:List[Symbol]=None,
+                 capacity=8):
+        """
+        :param alphabet: the symbols of the formula.
+        :param symbols:  the order of the symbols in the bitmask labels. By default, sorted by name.
+        :param capacity: the initial upper bound of the state ids. It is doubled when exceeded,
+                         so that the state space (see TemporalEvaluator.get_state_space) grows rarely.
+        """
         self.dfaotf   = dfaotf
-        self.alphabet = Alphabet({PLInterpretation(set(sym)) for sym in powerset(alphabet.symbols)})
+        self.alphabet = alphabet
+        self._index_symbols(symbols if symbols is not None else sorted(alphabet.symbols, key=str))
         self.reward   = reward
         self.gamma    = gamma
         self.dfaotf.reset()
         initial_state = self.dfaotf.cur_state
 
-        self.id2state = {0: initial_state}
-        self.state2id = {initial_state: 0}
+        self.id2state = {}
+        self.state2id = {}
+        self.capacity = capacity
 
-        self.states = {0}
+        self.states = set()
         self.initial_state = 0
+        # state id -> {label bitmask -> state id}
         self.transition_function = {}
         self.final_states = set()
         self.failure_states = set()
+        # the ids of the states where the formula is true
+        self.accepting_states = set()
+        self._add_state(initial_state)
+        self.cur_state = self.initial_state
+
+        # number of transitions answered by the transition table and computed by the DFAOTF
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # state id -> the ids of the states with a transition to it
+        self.predecessors = {}
+        # see RewardAutomaton._compute_levels. The states without a level cannot reach a known final state.
+        self.reachability_levels = {}
+        self.max_level = 0
 
         # a list of (old_state, label, new_state) to keep track of the sequence of states and labels
         self.trace = []
         self.changed = False
 
-        dfa = DFA(alphabet, frozenset(self.states), self.initial_state, frozenset(self.final_states), self.transition_function)
-        self._automaton = RewardAutomaton(dfa, alphabet, dfaotf.f, reward, gamma=gamma)
-
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # simulators pickled when the state space was fixed.
+        if "capacity" not in state:
+            self.capacity = max(100, len(self.states))
+        # simulators pickled with the whole automaton: compute the levels of the discovered graph.
+        if "reachability_levels" not in state:
+            self.__dict__.pop("_automaton", None)
+            # the alphabet was the powerset of the symbols
+            symbols = set()
+            for interpretation in self.alphabet.symbols:
+                symbols.update(interpretation.true_propositions)
+            self.alphabet = Alphabet(symbols)
+            self._index_symbols(sorted(symbols, key=str))
+            self.cur_state = self.state2id[self.dfaotf.cur_state]
+            self.accepting_states = {id for id, q in self.id2state.items() if DFAOTF._is_true(q)}
+            self.failure_states.update(id for id, q in self.id2state.items() if q == frozenset())
+            self.cache_hits = self.cache_misses = 0
+            self.transition_function = {s: {self.to_bitmask(i.true_propositions): s_prime
+                                            for i, s_prime in transitions.items()}
+                                        for s, transitions in self.transition_function.items()}
+            self.predecessors = {}
+            self.reachability_levels = {}
+            self.max_level = 0
+            for s, transitions in self.transition_function.items():
+                for s_prime in transitions.values():
+                    self.predecessors.setdefault(s_prime, set()).add(s)
+            for s in self.final_states:
+                self._update_levels(s, 0)
 
     def reset(self):
         self.dfaotf.reset()
+        self.cur_state = self.initial_state
 
         # (old state, label, new state) triple
         # for o, i, n in self.trace:
@@ -48,20 +109,24 @@ class PartialAutomatonSimulator(RewardSimulator):
         # self.trace = []
 
 
-    def make_transition(self, s:Set[Symbol]):
-        i = PLInterpretation(s)
-        old_state = self.dfaotf.cur_state
-        self.dfaotf.make_transition(i)
-
-        new_state = self.dfaotf.cur_state
-        self._update_from_transition(old_state, i, new_state)
-
-        if len(self._automaton.accepting_states) > 0:
-            reward = self._automaton.get_immediate_reward(self.state2id[old_state], self.state2id[self.dfaotf.cur_state])
+    def make_transition_bitmask(self, label:int):
+        old_state_id = self.cur_state
+        new_state_id = self.transition_function.get(old_state_id, {}).get(label)
+        if new_state_id is not None:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self.dfaotf.cur_state = self.id2state[old_state_id]
+            self.dfaotf.make_transition(PLInterpretation(self.to_symbols(label)))
+            new_state_id = self._update_from_transition(old_state_id, label, self.dfaotf.cur_state)
+        self.cur_state = new_state_id
+
+        if len(self.final_states) > 0:
+            reward = self.get_immediate_reward(old_state_id, new_state_id)
         else:
             if self.is_failed():
                 reward = -self.reward
-            elif old_state!=new_state:
+            elif old_state_id != new_state_id:
                 # give an optimistic reward to help exploration
                 reward = self.reward * 10e-4
             else:
@@ -71,40 +136,68 @@ class PartialAutomatonSimulator(RewardSimulator):
         return reward
 
     def get_immediate_reward(self, q, q_prime):
-        # q_id = self.id2state[q]
-        # q_prime_id = self.id2state[q_prime]
-        # return self._automaton.get_immediate_reward(q_id, q_prime_id)
-        return self._automaton.get_immediate_reward(q, q_prime)
+        # the same of RewardAutomaton.get_immediate_reward, on the discovered graph.
+        levels = self.reachability_levels
+        if q_prime not in levels:
+            return 0
+
+        r = self.gamma * (self.max_level - levels[q_prime]) - (self.max_level - levels[q])
+        if r > 0.0:
+            r /= self.max_level
+            r *= self.reward
+        return r
 
     def is_failed(self):
-        return self.dfaotf.cur_state == frozenset()
+        return self.cur_state in self.failure_states
 
     def is_true(self):
-        return self.dfaotf.is_true()
+        return self.cur_state in self.accepting_states
 
     def word_acceptance(self, word: List[Symbol]):
-        return self.dfaotf.word_acceptance([PLInterpretation(c) for c in word])
-
-    def _update_from_transition(self, old_state, label, new_state):
-        old_state_id = self._add_state(old_state)
+        self.reset()
+        for s in word:
+            self.make_transition(s)
+        return self.is_true()
+
+    def cache_hit_ratio(self):
+        """:returns the fraction of the transitions answered without the DFAOTF."""
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total > 0 else 0.0
+
+    def _update_from_transition(self, old_state_id, label, new_state):
+        """Add the new transition to the discovered graph.
+        :returns the id of the new state."""
         new_state_id = self._add_state(new_state)
 
         self.transition_function.setdefault(old_state_id, {})[label] = new_state_id
-        if self.is_failed():
-            self.failure_states.add(new_state_id)
-        elif self.is_true():
+        self.predecessors.setdefault(new_state_id, set()).add(old_state_id)
+        if new_state_id in self.accepting_states:
             self.final_states.add(new_state_id)
+            self._update_levels(new_state_id, 0)
 
-        dfa = DFA(self.alphabet, frozenset(self.states), self.initial_state, frozenset(self.final_states),
-                  self.transition_function)
-        self._automaton = RewardAutomaton(dfa, self.alphabet, self.dfaotf.f, self.reward, gamma=self.gamma)
-        # k = len(self._automaton.failure_states)
-        # s = self._automaton.failure_states.difference(self.states.difference(self.failure_states))
-        # self._automaton.failure_states = s
-        # cc = len(self._automaton.failure_states)
-        # if k != cc:
-        #     pass
-        #     print("HAHA", k, cc)
+        if new_state_id in self.reachability_levels:
+            self._update_levels(old_state_id, self.reachability_levels[new_state_id] + 1)
+
+        return new_state_id
+
+    def _update_levels(self, state_id, level):
+        """Lower the level of a state to 'level' (if greater), and propagate the change backward.
+        A breadth first search from the state, since the levels only decrease when the graph grows."""
+        levels = self.reachability_levels
+        if levels.get(state_id, level + 1) <= level:
+            return
+        levels[state_id] = level
+
+        queue = deque([state_id])
+        while queue:
+            s = queue.popleft()
+            next_level = levels[s] + 1
+            for p in self.predecessors.get(s, ()):
+                if levels.get(p, next_level + 1) > next_level:
+                    levels[p] = next_level
+                    queue.append(p)
+
+        self.max_level = max(levels.values()) + 1
 
     def _add_state(self, new_state):
         new_state_id = self.state2id.get(new_state, None)
@@ -113,8 +206,17 @@ class PartialAutomatonSimulator(RewardSimulator):
             self.states.add(new_state_id)
             self.id2state[new_state_id] = new_state
             self.state2id[new_state] = new_state_id
+            if new_state_id >= self.capacity:
+                self.capacity *= 2
+            if new_state == frozenset():
+                self.failure_states.add(new_state_id)
+            elif DFAOTF._is_true(new_state):
+                self.accepting_states.add(new_state_id)
 
         return new_state_id
 
     def get_cur_state(self):
-        return self.state2id[self.dfaotf.cur_state]
+        return self.cur_state
+
+    def get_current_state(self):
+        return self.get_cur_state()
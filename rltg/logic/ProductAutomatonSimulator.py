@@ -0,0 +1,132 @@
+from collections import deque
+from typing import List, Sequence, Set
+
+import numpy as np
+from pythomata.base.Symbol import Symbol
+
+from rltg.logic.RewardAutomatonSimulator import RewardSimulator, RewardAutomatonSimulator
+
+
+class ProductAutomatonSimulator(RewardSimulator):
+    """Simulator of the synchronous product of several compiled reward automata.
+
+    Only the product states reachable from the initial one are built, with a breadth first search.
+    The transition table and the reward table are indexed by [product state id, joint label], where the
+    joint label is the concatenation of the bitmask labels of the components: the label of the i-th
+    automaton is shifted by the total number of symbols of the previous ones.
+    The reward of a transition is the sum of the rewards of the components; a product state is
+    accepting if every component is accepting, and failed if some component is failed."""
+
+    def __init__(self, simulators:List[RewardAutomatonSimulator]):
+        self.simulators = list(simulators)
+        self.shifts = []
+        shift = 0
+        for sim in self.simulators:
+            self.shifts.append(shift)
+            shift += len(sim.symbols)
+        self.n_labels = 1 << shift
+
+        self._build()
+        self.reset()
+
+    def _build(self):
+        sims = self.simulators
+        m = len(sims)
+        # the radix of each component in the keys of the product states
+        radixes = np.cumprod([1] + [len(sim.id2state) for sim in sims[:-1]])
+
+        # the joint labels as (2^k_m, ..., 2^k_1) arrays: the component i varies along the axis m-1-i
+        def broadcast(row, i):
+            shape = [1] * m
+            shape[m - 1 - i] = len(row)
+            return row.reshape(shape)
+
+        initial = tuple(sim.state2id[sim.dfa.initial_state] for sim in sims)
+        self.initial_state = 0
+        key2id = {int(np.dot(initial, radixes)): self.initial_state}
+        self.id2components = [initial]
+        transitions, rewards = [], []
+
+        queue = deque([initial])
+        while queue:
+            components = queue.popleft()
+            next_states = sum(broadcast(sim.transitions[s], i) * radixes[i]
+                              for i, (sim, s) in enumerate(zip(sims, components)))
+            missing = sum(broadcast(sim.transitions[s] < 0, i)
+                          for i, (sim, s) in enumerate(zip(sims, components))) > 0
+            reward = 0.0
+            for i, (sim, s) in enumerate(zip(sims, components)):
+                reward = reward + broadcast(sim.transition_rewards[s], i)
+
+            keys, inverse = np.unique(np.where(missing, -1, next_states).ravel(), return_inverse=True)
+            ids = np.empty(len(keys), dtype=np.int64)
+            for j, key in enumerate(keys.tolist()):
+                if key < 0:
+                    ids[j] = -1
+                    continue
+                id = key2id.get(key)
+                if id is None:
+                    id = key2id[key] = len(self.id2components)
+                    next_components = tuple(int(key // r % len(sim.id2state)) for r, sim in zip(radixes, sims))
+                    self.id2components.append(next_components)
+                    queue.append(next_components)
+                ids[j] = id
+
+            transitions.append(ids[inverse])
+            rewards.append(np.where(missing, 0.0, reward).ravel())
+
+        self.transitions = np.stack(transitions)
+        self.transition_rewards = np.stack(rewards)
+        components = np.array(self.id2components, dtype=np.int64)
+        self.accepting = np.all([sim.accepting[components[:, i]] for i, sim in enumerate(sims)], axis=0)
+        self.failure = np.any([sim.failure[components[:, i]] for i, sim in enumerate(sims)], axis=0)
+
+    def to_joint_label(self, labels:Sequence[int]) -> int:
+        """:returns the joint label of the bitmask labels of the components."""
+        label = 0
+        for l, shift in zip(labels, self.shifts):
+            label |= l << shift
+        return label
+
+    def make_transition(self, s:Sequence[Set[Symbol]]):
+        """:param s: the set of true symbols of each component (the same symbol may belong to many automata)."""
+        return self.make_transition_bitmask(
+            self.to_joint_label([sim.to_bitmask(x) for sim, x in zip(self.simulators, s)]))
+
+    def make_transition_bitmask(self, label:int):
+        """:param label: the joint label (see to_joint_label)."""
+        old_state = self.cur_state
+        new_state = self.transitions.item(old_state, label)
+        if new_state < 0:
+            raise ValueError("no transition from state {} with label {}".format(old_state, label))
+        self.cur_state = new_state
+        return self.transition_rewards.item(old_state, label)
+
+    def get_immediate_reward(self, q, q_prime):
+        return sum(sim.get_immediate_reward(s, s_prime) for sim, s, s_prime
+                   in zip(self.simulators, self.id2components[q], self.id2components[q_prime]))
+
+    def get_components(self, q=None):
+        """:returns the state ids of the components of the product state q (default: the current one)."""
+        return self.id2components[self.cur_state if q is None else q]
+
+    def is_true(self):
+        return self.accepting.item(self.cur_state)
+
+    def is_failed(self):
+        return self.failure.item(self.cur_state)
+
+    def word_acceptance(self, word:List[Sequence[Set[Symbol]]]):
+        self.reset()
+        for s in word:
+            self.make_transition(s)
+        return self.is_true()
+
+    def reset(self):
+        self.cur_state = self.initial_state
+
+    def get_cur_state(self):
+        return self.cur_state
+
+    def get_current_state(self):
+        return self.cur_state
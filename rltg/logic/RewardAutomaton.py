@@ -1,10 +1,14 @@
-from copy import copy
+from collections import deque
+
+import numpy as np
 from flloat.base.Alphabet import Alphabet
 from flloat.base.Symbol import Symbol
 from flloat.syntax.ldlf import LDLfFormula
 from pythomata.base.DFA import DFA
 from typing import Set
 
+from rltg.logic.AutomatonCache import AutomatonCache
+
 
 class RewardAutomaton(DFA):
     def __init__(self, dfa:DFA, alphabet:Alphabet, f:LDLfFormula, reward, gamma=0.99):
@@ -26,26 +30,67 @@ class RewardAutomaton(DFA):
 
         self.gamma = gamma
 
+        # the potential of every state and the failure flags, indexed by state2index
+        self.state2index = {s: i for i, s in enumerate(self.states)}
+        self.phi, self.failure = self._compute_potentials()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # automata pickled before the precomputation of the potentials.
+        if "phi" not in state:
+            self.state2index = {s: i for i, s in enumerate(self.states)}
+            self.phi, self.failure = self._compute_potentials()
+
     @staticmethod
-    def _fromFormula(alphabet:Set[Symbol], f:LDLfFormula, reward, gamma=0.99):
-        dfa = f.to_automaton(alphabet, determinize=True, minimize=True)
+    def _fromFormula(alphabet:Set[Symbol], f:LDLfFormula, reward, gamma=0.99, cache:AutomatonCache=None):
+        """:param cache: if not None, the DFA of the formula is taken from (or stored into) the cache."""
+        if cache is None:
+            dfa = f.to_automaton(alphabet, determinize=True, minimize=True)
+        else:
+            dfa = cache.get_or_compile(f, list(alphabet), reward, gamma)
         return RewardAutomaton(dfa, dfa.alphabet, f, reward, gamma=gamma)
 
     def get_formula_reward(self):
         return self.reward
 
     def get_immediate_reward(self, q, q_prime):
-        phi = self.potential_function
-        if q_prime in self.failure_states:
-            # return -self.reward
+        i, j = self.state2index[q], self.state2index[q_prime]
+        if self.failure.item(j):
             return 0
 
-        r = self.gamma * phi(q_prime) - phi(q)
+        r = self.gamma * self.phi.item(j) - self.phi.item(i)
         if r > 0.0:
             r /= self.max_level
             r *= self.reward
         return r
 
+    def get_immediate_rewards(self, q_indexes, q_prime_indexes):
+        """The vectorized get_immediate_reward, e.g. for all the transitions of a transition table.
+        :param q_indexes:       the array of the indexes (see state2index) of the source states.
+        :param q_prime_indexes: the array of the indexes of the destination states, of the same shape.
+        :returns the array of the rewards."""
+        rewards = self.gamma * self.phi[q_prime_indexes] - self.phi[q_indexes]
+        positive = rewards > 0.0
+        rewards[positive] /= self.max_level
+        rewards[positive] *= self.reward
+        rewards[self.failure[q_prime_indexes]] = 0
+        return rewards
+
+    def _compute_potentials(self):
+        """The reward of going from q to q_prime is gamma * phi(q_prime) - phi(q),
+        scaled by reward/max_level if positive. Going to a failure state gives 0.
+        The potential of the failure states is not defined (0 here): the transitions from them
+        can only go to failure states.
+        :returns the arrays of the potential and of the failure flag of every state."""
+        phi = np.zeros(len(self.state2index))
+        failure = np.zeros(len(self.state2index), dtype=bool)
+        for q, i in self.state2index.items():
+            if q in self.failure_states:
+                failure[i] = True
+            else:
+                phi[i] = self.potential_function(q)
+        return phi, failure
+
     def complete(self):
         return RewardAutomaton(self._dfa.complete(), self.alphabet, self.f, self.reward)
 
@@ -59,33 +104,28 @@ class RewardAutomaton(DFA):
         return self.max_level - self.reachability_levels[q]
 
     def _compute_levels(self):
-        level = 0
-        state2level = {final_state: level for final_state in self._dfa.accepting_states}
-
-        z_current = set()
-        z_next = set(self._dfa.accepting_states)
-        while z_current != z_next:
-            level += 1
-            z_current = z_next
-            z_next = copy(z_current)
-            for s in self._dfa.states:
-                if s in z_current:
-                    continue
-                for a in self.transition_function.get(s, []):
-                    next_state = self.transition_function[s][a]
-                    if next_state in z_current:
-                        z_next.add(s)
-                        state2level[s] = level
-
-        z_current = z_next
-
-        # levels for failure state (i.e. that cannot reach a final state)
-        failure_states = set()
-        for s in filter(lambda x: x not in z_current, self._dfa.states):
-            # state2level[s] = level
-            failure_states.add(s)
-
-        max_level = level
+        """The level of a state is the length of the shortest path to a final state,
+        computed with a breadth first search on the reversed transitions, from the final states.
+        The max level is the number of levels (i.e. the greatest level plus one), 0 without final states."""
+        predecessors = {}
+        for s in self._dfa.states:
+            for next_state in self.transition_function.get(s, {}).values():
+                predecessors.setdefault(next_state, []).append(s)
+
+        state2level = {final_state: 0 for final_state in self._dfa.accepting_states}
+        queue = deque(state2level)
+        while queue:
+            s = queue.popleft()
+            level = state2level[s] + 1
+            for p in predecessors.get(s, ()):
+                if p not in state2level:
+                    state2level[p] = level
+                    queue.append(p)
+
+        # failure states (i.e. that cannot reach a final state)
+        failure_states = set(s for s in self._dfa.states if s not in state2level)
+
+        max_level = max(state2level.values()) + 1 if state2level else 0
         return state2level, max_level, failure_states
 
 
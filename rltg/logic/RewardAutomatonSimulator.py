@@ -1,7 +1,8 @@
 from abc import abstractmethod
-from typing import Set
+from typing import Set, List
+
+import numpy as np
 
-from flloat.semantics.pl import PLInterpretation
 from pythomata.base.Simulator import DFASimulator, Simulator
 from pythomata.base.Symbol import Symbol
 from pythomata.base.utils import Sink
@@ -9,6 +10,37 @@ from pythomata.base.utils import Sink
 from rltg.logic.RewardAutomaton import RewardAutomaton
 
 class RewardSimulator(Simulator):
+    """A simulator which gives a reward at every transition.
+    The labels can be given as sets of true symbols, or as bitmasks: the bit i is set iff
+    the symbol self.symbols[i] is true."""
+
+    def _index_symbols(self, symbols:List[Symbol]):
+        self.symbols = list(symbols)
+        self.symbol2bit = {sym: 1 << i for i, sym in enumerate(self.symbols)}
+
+    def to_bitmask(self, s:Set[Symbol]):
+        """:returns the bitmask of the set of true symbols 's'.
+        :raises ValueError if some symbol is not in the alphabet."""
+        label = 0
+        for sym in s:
+            bit = self.symbol2bit.get(sym)
+            if bit is None:
+                raise ValueError("symbol not in the alphabet: {}".format(sym))
+            label |= bit
+        return label
+
+    def to_symbols(self, label:int):
+        """:returns the frozenset of the symbols true in the bitmask 'label'."""
+        return frozenset(sym for sym, bit in self.symbol2bit.items() if label & bit)
+
+    def make_transition(self, s:Set[Symbol]):
+        return self.make_transition_bitmask(self.to_bitmask(s))
+
+    @abstractmethod
+    def make_transition_bitmask(self, label:int):
+        """Like make_transition, but the set of true symbols is given as bitmask (see to_bitmask).
+        :returns the reward."""
+        raise NotImplementedError
 
     @abstractmethod
     def get_immediate_reward(self, q, q_prime):
@@ -20,20 +52,68 @@ class RewardSimulator(Simulator):
 
 
 class RewardAutomatonSimulator(DFASimulator, RewardSimulator):
-    def __init__(self, dfa:RewardAutomaton):
+    """Simulator of a RewardAutomaton.
+
+    The automaton is compiled once into arrays: the transition table and the reward of each transition,
+    indexed by [state id, label bitmask] (see RewardSimulator), and the accepting and failure flags of each state id. Then a step is one read of the tables."""
+
+    def __init__(self, dfa:RewardAutomaton, symbols:List[Symbol]=None):
+        """
+        :param dfa:     the reward automaton.
+        :param symbols: the order of the symbols in the bitmask labels. By default, sorted by name.
+        """
         super().__init__(dfa)
+        self._index_symbols(symbols if symbols is not None else self._default_symbols())
+        self._compile()
         self.visited_states = {self.cur_state}
 
+    def _default_symbols(self):
+        symbols = set()
+        for interpretation in self.dfa.alphabet.symbols:
+            symbols.update(interpretation.true_propositions)
+        return sorted(symbols, key=str)
+
+    def _compile(self):
+        n_states = len(self.id2state)
+        self.initial_state = self.state2id[self.dfa.initial_state]
+        # -1 marks a missing transition
+        self.transitions = np.full((n_states, 1 << len(self.symbols)), -1, dtype=np.int64)
+        for q_id, q in self.id2state.items():
+            for interpretation, q_prime in self.dfa.transition_function.get(q, {}).items():
+                self.transitions[q_id, self.to_bitmask(interpretation.true_propositions)] = self.state2id[q_prime]
+
+        # the reward of every transition
+        index = np.array([self.dfa.state2index[self.id2state[q_id]] for q_id in range(n_states)])
+        sources = np.broadcast_to(index[:, np.newaxis], self.transitions.shape)
+        self.transition_rewards = np.where(self.transitions >= 0,
+                                           self.dfa.get_immediate_rewards(sources, index[self.transitions]), 0.0)
+
+        self.accepting = np.array([self.id2state[q_id] in self.dfa.accepting_states for q_id in range(n_states)])
+        self.failure = np.array([self.id2state[q_id] in self.dfa.failure_states for q_id in range(n_states)])
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # simulators pickled before the compilation of the automaton.
+        if "transition_rewards" not in state:
+            self._index_symbols(state.get("symbols") or self._default_symbols())
+            self._compile()
+
     def reset(self):
         super().reset()
         self.visited_states = {self.cur_state}
 
     def make_transition(self, s:Set[Symbol]):
-        i = PLInterpretation(s)
+        # not the one of DFASimulator
+        return RewardSimulator.make_transition(self, s)
+
+    def make_transition_bitmask(self, label:int):
         old_state = self.cur_state
-        super().make_transition(i)
-        reward = self.get_immediate_reward(old_state, self.cur_state)
-        self.visited_states.add(self.cur_state)
+        new_state = self.transitions.item(old_state, label)
+        if new_state < 0:
+            raise ValueError("no transition from state {} with label {}".format(old_state, label))
+        self.cur_state = new_state
+        reward = self.transition_rewards.item(old_state, label)
+        self.visited_states.add(new_state)
 
         return reward
 
@@ -42,8 +122,11 @@ class RewardAutomatonSimulator(DFASimulator, RewardSimulator):
         q_prime_id = self.id2state[q_prime]
         return self.dfa.get_immediate_reward(q_id, q_prime_id)
 
+    def is_true(self):
+        return self.accepting.item(self.cur_state)
+
     def is_failed(self):
-        return self.id2state[self.cur_state] in self.dfa.failure_states
+        return self.failure.item(self.cur_state)
 
     def get_cur_state(self):
         return self.cur_state
@@ -83,6 +83,7 @@ class Trainer(object):
                 agent.save(self.agent_data_dir)
 
         agent.save(self.agent_data_dir)
+        agent.close()
         stats.plot()
 
 
@@ -17,6 +17,9 @@ setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest', ]
 
+# compiled kernels for the TD brains (see rltg/agents/brains/kernels.py)
+extras_requirements = {'numba': ['numba']}
+
 setup(
     author="Marco Favorito",
     author_email='marco.favorito@gmail.com',
@@ -30,6 +33,7 @@ setup(
     ],
     description="Framework for Reinforcement Learning with Temporal Goals.",
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A small world for the tests of TGAgent and of the temporal evaluators.
+
+The robot moves left or right on a chain of LENGTH positions. The temporal goal is to reach the last position,
+and then the first one: "a" is true at the last position, "b" at the first one."""
+
+import random
+
+import numpy as np
+from flloat.base.Symbol import Symbol
+from flloat.parser.ldlf import LDLfParser
+from gym.spaces import Discrete, Tuple, prng
+
+from rltg.agents.TGAgent import TGAgent
+from rltg.agents.brains.TDBrain import QLearning
+from rltg.agents.exploration_policies.RandomPolicy import RandomPolicy
+from rltg.agents.feature_extraction import RobotFeatureExtractor, FeatureExtractor
+from rltg.agents.temporal_evaluator.TemporalEvaluator import TemporalEvaluator
+
+LENGTH = 10
+GOAL = "<(!a & !b)*;(a & !b);(!b)*;b>tt"
+A, B = Symbol("a"), Symbol("b")
+
+
+class ChainEnv(object):
+    observation_space = Discrete(LENGTH)
+    action_space = Discrete(2)
+
+    def __init__(self, max_steps=100):
+        self.max_steps = max_steps
+
+    def reset(self):
+        self.position, self.steps = LENGTH // 2, 0
+        return self.position
+
+    def step(self, action):
+        self.position = min(self.position + 1, LENGTH - 1) if action == 1 else max(self.position - 1, 0)
+        self.steps += 1
+        return self.position, -0.01, self.steps >= self.max_steps, {}
+
+
+class ChainRobot(RobotFeatureExtractor):
+    def __init__(self):
+        super().__init__(Discrete(LENGTH), Tuple((Discrete(LENGTH),)))
+
+    def _extract(self, input, **kwargs):
+        return (input,)
+
+
+class ChainGoal(FeatureExtractor):
+    def __init__(self):
+        super().__init__(Discrete(LENGTH), Discrete(LENGTH))
+
+    def _extract(self, input, **kwargs):
+        return input
+
+
+class ChainEvaluator(TemporalEvaluator):
+    def __init__(self, formula=GOAL, reward=10, **kwargs):
+        super().__init__(ChainGoal(), {A, B}, LDLfParser()(formula), reward, **kwargs)
+
+    def fromFeaturesToPropositional(self, features):
+        symbols = set()
+        if features == LENGTH - 1:
+            symbols.add(A)
+        if features == 0:
+            symbols.add(B)
+        return frozenset(symbols)
+
+
+def seed(value):
+    random.seed(value)
+    np.random.seed(value)
+    prng.seed(value)
+
+
+def make_agent(temporal_evaluators, brain=None, **kwargs):
+    """:param kwargs: the other arguments of TGAgent."""
+    if brain is None:
+        brain = QLearning(None, ChainEnv.action_space, gamma=0.99, alpha=0.1, nsteps=5)
+    return TGAgent(ChainRobot(), RandomPolicy(ChainEnv.action_space, epsilon=0.2), brain, temporal_evaluators,
+                   **kwargs)
+
+
+def train(agent, episodes, env=None):
+    """:returns the list of the rewards received by the agent."""
+    env = env or ChainEnv()
+    rewards = []
+    for _ in range(episodes):
+        state, done = env.reset(), False
+        while not done and not any(te.is_failed() for te in agent.temporal_evaluators):
+            action = agent.act(state)
+            state2, reward, done, _ = env.step(action)
+            agent.observe(state, action, reward, state2)
+            agent.replay()
+            agent.update()
+            rewards.append(agent.brain.obs_history[-1][2])
+            state = state2
+        agent.reset()
+    return rewards
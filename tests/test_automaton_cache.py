@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `AutomatonCache`: the round trip of the compiled automata and the key of the entries."""
+
+import os
+
+import numpy as np
+import pytest
+from flloat.base.Symbol import Symbol
+from flloat.parser.ldlf import LDLfParser
+
+from chain_world import A, B, ChainEvaluator, GOAL
+from rltg.logic.AutomatonCache import AutomatonCache
+
+FORMULAS = [GOAL, "<(!b)*;b;(!a)*;a>tt", "[true*](<b>tt -> <true*;a>tt)"]
+COMPILED_ARRAYS = ("transitions", "transition_rewards", "accepting", "failure", "initial_state")
+
+
+@pytest.mark.parametrize("formula", FORMULAS)
+def test_round_trip(tmpdir, monkeypatch, formula):
+    cache = AutomatonCache(str(tmpdir))
+    fresh = ChainEvaluator(formula=formula, gamma=0.9).simulator
+    ChainEvaluator(formula=formula, gamma=0.9, automaton_cache=cache)
+    assert len(os.listdir(str(tmpdir))) == 1
+
+    # a hit does not compile the formula again
+    def fail(*args, **kwargs):
+        raise AssertionError("the formula is compiled again")
+    monkeypatch.setattr(type(LDLfParser()(formula)), "to_automaton", fail)
+    cached = ChainEvaluator(formula=formula, gamma=0.9, automaton_cache=cache).simulator
+
+    for name in COMPILED_ARRAYS:
+        assert np.array_equal(getattr(cached, name), getattr(fresh, name)), name
+
+
+def test_key(tmpdir):
+    parser = LDLfParser()
+    f = parser(GOAL)
+    symbols = [A, B]
+    key = AutomatonCache.key(f, symbols, 10, 0.99)
+    assert key == AutomatonCache.key(parser(GOAL), [B, A], 10, 0.99)
+
+    others = [AutomatonCache.key(parser("<(!b)*;b;(!a)*;a>tt"), symbols, 10, 0.99),
+              AutomatonCache.key(f, symbols, 5, 0.99),
+              AutomatonCache.key(f, symbols, 10, 0.9),
+              AutomatonCache.key(f, symbols + [Symbol("c")], 10, 0.99)]
+    assert key not in others
+    assert len(set(others)) == len(others)
+
+    cache = AutomatonCache(str(tmpdir))
+    cache.get_or_compile(f, symbols, 10, 0.99)
+    assert cache.load(f, [B, A], 10, 0.99) is not None
+    assert cache.load(parser("<(!b)*;b;(!a)*;a>tt"), symbols, 10, 0.99) is None
+    assert cache.load(f, symbols, 5, 0.99) is None
+    assert cache.load(f, symbols, 10, 0.9) is None
+    assert cache.load(f, symbols + [Symbol("c")], 10, 0.99) is None
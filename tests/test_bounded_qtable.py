@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the eviction of `BoundedQTable` and its filter of the evicted states."""
+
+import numpy as np
+import pytest
+
+from rltg.agents.brains.qtables.BoundedQTable import BoundedQTable, EVICTION_POLICIES
+
+N_ACTIONS = 2
+
+
+@pytest.mark.parametrize("policy", EVICTION_POLICIES)
+def test_capacity(policy):
+    table = BoundedQTable(N_ACTIONS, capacity=50, eviction_policy=policy, eviction_ratio=0.1)
+    rng = np.random.RandomState(0)
+    for s in rng.randint(0, 1000, size=5000).tolist():
+        table.backup(s, s % N_ACTIONS, 1.0)
+        assert len(table.slots) <= table.capacity
+        assert len(table) <= table.capacity
+    assert table.n_evictions > 0
+    assert len(table) + len(table.free_slots) == table.capacity
+
+
+def test_evicted_states():
+    table = BoundedQTable(N_ACTIONS, capacity=10, eviction_policy="lru", eviction_ratio=0.1)
+    for s in range(10):
+        table.update(s, 0, float(s))
+    # the least recently updated state makes room for the new one
+    table.update(10, 0, 10.0)
+    assert table.n_evictions == 1
+    assert 0 not in table and np.array_equal(table[0], np.zeros(N_ACTIONS))
+    assert all(s in table for s in range(1, 11))
+
+    assert table.n_rediscoveries == 0
+    table.update(0, 0, 1.0)
+    assert table.n_rediscoveries == 1
+    assert table[0][0] == 1.0
+
+
+def test_least_visited():
+    table = BoundedQTable(N_ACTIONS, capacity=10, eviction_policy="least_visited", eviction_ratio=0.2)
+    for s in range(10):
+        for _ in range(s + 1):
+            table.backup(s, 0, 1.0)
+    table.backup(10, 0, 1.0)
+    assert 0 not in table and 1 not in table
+    assert all(s in table for s in range(2, 11))
+
+
+def test_filter_generations():
+    table = BoundedQTable(N_ACTIONS, capacity=100, eviction_ratio=0.01, filter_size=100)
+    # the state 0 is evicted first, then 1000 states more
+    for s in range(1100):
+        table.update(s, 0, 1.0)
+    assert table.n_evictions == 1000
+    # the filter remembers only the last 100 to 200 evictions
+    rediscovered = sum(table._was_evicted(s) for s in range(1000))
+    assert 100 <= rediscovered <= 200 + 5
+    assert all(table._was_evicted(s) for s in range(900, 1000))
+    assert not table._was_evicted(0)
+
+
+def test_filter_false_positives():
+    table = BoundedQTable(N_ACTIONS, capacity=1000, eviction_ratio=0.01)
+    # every state is new: the rediscoveries are false positives, below 0.5%
+    for s in range(5000):
+        table.update(s, 0, 1.0)
+    assert table.n_rediscoveries / table.n_evictions < 0.005
+
+    false_positives = sum(table._was_evicted(s) for s in range(10**6, 10**6 + 20000))
+    assert false_positives / 20000 < 0.005
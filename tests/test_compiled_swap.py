@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the hot swap of the automata compiled in background (`TemporalEvaluator.swap_compiled`)."""
+
+import pickle
+
+import numpy as np
+
+from chain_world import ChainEvaluator, LENGTH, make_agent, seed, train
+from rltg.agents.brains.qtables.QTable import QTable
+from rltg.logic.PartialAutomatonSimulator import PartialAutomatonSimulator
+from rltg.logic.RewardAutomatonSimulator import RewardAutomatonSimulator
+
+
+def on_the_fly_evaluator():
+    """:returns an evaluator on the fly, with its compilation running but not swapped in until the next reset."""
+    te = ChainEvaluator(compile_timeout=0.0)
+    assert te.on_the_fly and te._compiler is not None
+    te._compiler.poll(None)
+    assert te._compiler.dfa is not None
+    return te
+
+
+def labels(n, rng):
+    """Random labels of the chain: a, b or nothing."""
+    te = ChainEvaluator(on_the_fly=True)
+    return [te.fromFeaturesToBitmask(x) for x in rng.choice([0, LENGTH // 2, LENGTH - 1], size=n)]
+
+
+def test_swap_maps_the_brain_states():
+    seed(0)
+    # the compiler is taken away while training, so that the swap happens only at the last reset.
+    te = on_the_fly_evaluator()
+    compiler, te._compiler = te._compiler, None
+    agent = make_agent([te])
+    train(agent, 30)
+    partial = te.simulator
+    assert isinstance(partial, PartialAutomatonSimulator)
+    n_partial = len(partial.states)
+    old_encoder = agent._from_tuple_to_int
+    q_table = agent.brain.Q
+    old_states = list(q_table.Q.keys() | q_table.Visits.keys())
+    before = {s: (q_table[s].copy(), q_table.visits_row(s).copy()) for s in old_states}
+
+    te._compiler = compiler
+    agent.reset()
+    assert not te.on_the_fly and te._compiler is None
+    compiled = te.simulator
+    assert isinstance(compiled, RewardAutomatonSimulator)
+    assert compiled.get_cur_state() == compiled.initial_state
+
+    # the mapping of the automaton states follows the discovered transitions
+    state_mapping = te._map_states(partial, compiled)
+    for s, transitions in partial.transition_function.items():
+        for label, s_prime in transitions.items():
+            assert compiled.transitions[state_mapping[s], label] == state_mapping[s_prime]
+    for s in range(n_partial):
+        assert compiled.accepting[state_mapping[s]] == (s in partial.accepting_states)
+
+    # every brain state is mapped to the one with the new automaton state, merged ones keep the most visited
+    new_encoder = agent._from_tuple_to_int
+    assert new_encoder.input_space.spaces[-1].n == len(compiled.state2id)
+    old_tuples = old_encoder.decode_batch(np.array(old_states))
+    old_tuples[:, -1] = state_mapping[old_tuples[:, -1]]
+    new_states = new_encoder.encode_batch(old_tuples)
+    visits = [before[s][1].sum() for s in old_states]
+    survivors = QTable._survivors(np.array(old_states), new_states, visits)
+    assert len(q_table) == len(survivors)
+    for i in survivors.tolist():
+        q_values, visits_row = before[old_states[i]]
+        assert np.array_equal(q_table[int(new_states[i])], q_values)
+        assert np.array_equal(q_table.visits_row(int(new_states[i])), visits_row)
+
+    # the rewards are the ones of the compiled automaton from the start
+    reference = ChainEvaluator().simulator
+    for label in labels(200, np.random.RandomState(0)):
+        assert compiled.make_transition_bitmask(label) == reference.make_transition_bitmask(label)
+        assert compiled.get_cur_state() == reference.get_cur_state()
+        if compiled.is_failed():
+            compiled.reset()
+            reference.reset()
+
+    # and the agent goes on, in the new state space
+    train(agent, 5)
+    assert all(0 <= state < new_encoder.output_space.n for state in q_table.Q)
+
+
+def test_resumed_evaluator_compiles_again():
+    te = on_the_fly_evaluator()
+    te.update(LENGTH - 1)
+    restored = pickle.loads(pickle.dumps(te))
+    te.close()
+
+    assert restored.on_the_fly and restored._compiler is not None
+    restored._compiler.poll(None)
+    state_mapping = restored.swap_compiled()
+    assert state_mapping is not None
+    assert not restored.on_the_fly
+    assert restored.get_state() == state_mapping[te.get_state()]
+    assert restored.get_state_space() == ChainEvaluator().get_state_space()
+
+
+def test_on_the_fly_evaluator_does_not_compile():
+    te = ChainEvaluator(on_the_fly=True)
+    restored = pickle.loads(pickle.dumps(te))
+    assert restored.on_the_fly and restored._compiler is None
+    assert restored.swap_compiled() is None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `HashQTable`, against the dictionary representation."""
+
+import numpy as np
+import pytest
+
+from rltg.agents.brains.qtables.HashQTable import HashQTable
+from rltg.agents.brains.qtables.QTable import DictQTable
+
+N_ACTIONS = 3
+
+
+def assert_same(table, reference, keys):
+    assert len(table) == len(reference)
+    for s in keys:
+        assert (s in table) == (s in reference)
+        assert np.allclose(table[s], reference[s])
+        assert np.array_equal(table.visits_row(s), reference.visits_row(s))
+    assert np.allclose(table.get_rows(keys), reference.get_rows(keys))
+
+    states, actions = table.greedy_policy()
+    expected_states, _ = reference.greedy_policy()
+    assert sorted(states.tolist()) == sorted(expected_states)
+    for s, a in zip(states.tolist(), actions.tolist()):
+        assert reference[s][a] == pytest.approx(reference[s].max())
+
+
+def random_operations(rng, tables, keys, n):
+    for _ in range(n):
+        s, a = int(rng.choice(keys)), int(rng.randint(N_ACTIONS))
+        op = rng.randint(4)
+        for table in tables:
+            if op == 0:
+                table.update(s, a, 0.5)
+            elif op == 1:
+                table.backup(s, a, float(s % 7), None)
+            elif op == 2:
+                table.backup(s, a, 1.0, 0.1)
+            else:
+                table.inc_visits(s, a)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fuzz_against_dict(seed):
+    """Random operations on a table much smaller than the keys, so that it is resized many times,
+    then a remap which merges some states, and more operations."""
+    rng = np.random.RandomState(seed)
+    # clustered keys, negative ones and large ones, so that many keys probe the same slots.
+    keys = np.concatenate([np.arange(200), -np.arange(1, 50), rng.randint(0, 2**62, size=100)])
+    table = HashQTable(N_ACTIONS, capacity=2, dtype=np.float64, visits_dtype=np.int64)
+    reference = DictQTable(N_ACTIONS)
+
+    random_operations(rng, (table, reference), keys, 3000)
+    assert table.capacity > 2
+    assert table.n_used <= table.max_load * table.capacity
+    assert_same(table, reference, keys)
+
+    # a mapping which merges some states
+    targets = dict(zip(keys.tolist(), rng.randint(0, 150, size=len(keys)).tolist()))
+    mapping = lambda states: np.array([targets[s] for s in np.asarray(states).tolist()], dtype=np.int64)
+    table.remap(mapping)
+    reference.remap(mapping)
+    new_keys = np.arange(150)
+    assert_same(table, reference, new_keys)
+    for s in keys.tolist():
+        if s not in targets.values():
+            assert s not in table
+
+    random_operations(rng, (table, reference), new_keys, 1000)
+    assert_same(table, reference, new_keys)
+
+
+def test_unknown_states():
+    table = HashQTable(N_ACTIONS)
+    assert 5 not in table
+    assert len(table) == 0
+    assert np.array_equal(table[5], np.zeros(N_ACTIONS))
+    assert table.get_visits(5, 0) == 0
+    # reading does not insert
+    assert table.n_used == 0
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the files of `MemmapQTable`."""
+
+import pickle
+
+import numpy as np
+
+from rltg.agents.brains.qtables.MemmapQTable import MemmapQTable
+
+
+def test_new_table_overwrites_old_files(tmpdir):
+    table = MemmapQTable(10, 2, directory=str(tmpdir))
+    table.update(3, 1, 5.0)
+    table.inc_visits(3, 1)
+    table.flush()
+
+    # a new run in the same directory does not inherit the values of the earlier one.
+    table = MemmapQTable(10, 2, directory=str(tmpdir))
+    assert len(table) == 0
+    assert np.array_equal(table[3], np.zeros(2))
+    assert table.get_visits(3, 1) == 0
+
+
+def test_restored_table_reuses_files(tmpdir):
+    table = MemmapQTable(10, 2, directory=str(tmpdir))
+    table.update(3, 1, 5.0)
+    table.inc_visits(3, 1)
+    restored = pickle.loads(pickle.dumps(table))
+
+    assert len(restored) == 1
+    assert restored[3][1] == 5.0
+    assert restored.get_visits(3, 1) == 1
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the n-step returns of `NStepBuffer` and `TDBrain`."""
+
+import random
+
+import numpy as np
+import pytest
+from gym.spaces import Discrete
+
+from rltg.agents.brains.NStepBuffer import NStepBuffer
+from rltg.agents.brains.TDBrain import QLearning
+
+
+def naive_return(rewards, gamma):
+    return sum(r * gamma ** i for i, r in enumerate(rewards))
+
+
+@pytest.mark.parametrize("nsteps", [1, 2, 5, 16])
+def test_discounted_return(nsteps):
+    """The rolling return is the sum of the discounted rewards in the window, also across many blocks."""
+    gamma = 0.9
+    rng = random.Random(nsteps)
+    buffer = NStepBuffer(nsteps, gamma)
+    rewards = []
+    for t in range(10 * nsteps + 3):
+        r = rng.uniform(-1, 1)
+        rewards.append(r)
+        buffer.append((t, 0, r, t + 1))
+
+        window = rewards[-nsteps:]
+        assert len(buffer) == len(window)
+        assert buffer.is_full() == (len(window) == nsteps)
+        assert buffer.discounted_return() == pytest.approx(naive_return(window, gamma), rel=1e-12, abs=1e-12)
+        expected_suffixes = [naive_return(window[i:], gamma) for i in range(len(window))]
+        assert np.allclose(buffer.suffix_returns(), expected_suffixes, rtol=1e-12, atol=1e-12)
+
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.discounted_return() == 0.0
+
+
+def reference_q_learning(episodes, nsteps, gamma, alpha, n_actions):
+    """The list-based n-step Q-learning: bootstrap after nsteps observations, and at the end of the episode
+    update each of the remaining (at most nsteps) observations once, without bootstrap."""
+    Q, Visits = {}, {}
+    q = lambda s: Q.setdefault(s, np.zeros(n_actions))
+
+    def backup(s, a, target):
+        if alpha:
+            step = alpha
+        else:
+            Visits[(s, a)] = Visits.get((s, a), 0) + 1
+            step = 1.0 / Visits[(s, a)]
+        q(s)[a] += step * (target - q(s)[a])
+
+    for episode in episodes:
+        for t, (s, a, r, s2) in enumerate(episode):
+            Visits[(s, a)] = Visits.get((s, a), 0) + 1
+            tau = t + 1 - nsteps
+            if tau >= 0:
+                rewards = [obs[2] for obs in episode[tau:t + 1]]
+                target = naive_return(rewards, gamma) + gamma ** nsteps * q(s2).max()
+                backup(episode[tau][0], episode[tau][1], target)
+        for tau in range(max(0, len(episode) - nsteps), len(episode)):
+            rewards = [obs[2] for obs in episode[tau:]]
+            backup(episode[tau][0], episode[tau][1], naive_return(rewards, gamma))
+    return Q
+
+
+@pytest.mark.parametrize("nsteps,alpha", [(1, 0.1), (3, 0.1), (3, None), (8, None)])
+def test_q_learning_nsteps(nsteps, alpha):
+    """Random episodes, many shorter than nsteps."""
+    gamma, n_states, n_actions = 0.95, 6, 2
+    rng = random.Random(0)
+    episodes = []
+    for _ in range(100):
+        s, episode = 0, []
+        for _ in range(rng.randint(1, 2 * nsteps + 2)):
+            s2 = rng.randrange(n_states)
+            episode.append((s, rng.randrange(n_actions), rng.choice([0.0, 1.0, -1.0]), s2))
+            s = s2
+        episodes.append(episode)
+
+    brain = QLearning(None, Discrete(n_actions), gamma=gamma, alpha=alpha, nsteps=nsteps)
+    for episode in episodes:
+        for obs in episode:
+            brain.observe(*obs)
+            brain.learn()
+            brain.update()
+        brain.reset()
+
+    expected = reference_q_learning(episodes, nsteps, gamma, alpha, n_actions)
+    for s, row in expected.items():
+        assert np.allclose(brain.Q[s], row, rtol=1e-10, atol=1e-12)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `ProductTemporalEvaluator`, against its component evaluators stepped separately."""
+
+import numpy as np
+import pytest
+
+from chain_world import ChainEvaluator, GOAL, LENGTH, make_agent
+from rltg.agents.temporal_evaluator.ProductTemporalEvaluator import ProductTemporalEvaluator
+
+FORMULAS = [GOAL, "<(!b)*;b;(!a)*;a>tt", "[true*](<b>tt -> <true*;a>tt)"]
+
+
+@pytest.mark.parametrize("n_goals", [2, 3])
+@pytest.mark.parametrize("seed", range(3))
+def test_product_against_components(n_goals, seed):
+    formulas = FORMULAS[:n_goals]
+    product = ProductTemporalEvaluator([ChainEvaluator(formula=f, reward=i + 1) for i, f in enumerate(formulas)])
+    components = [ChainEvaluator(formula=f, reward=i + 1) for i, f in enumerate(formulas)]
+
+    rng = np.random.RandomState(seed)
+    n_failures = n_true = 0
+    for position in rng.choice([0, LENGTH // 2, LENGTH - 1], size=500):
+        _, reward = product.update(position)
+        rewards = [te.update(position)[1] for te in components]
+        assert reward == pytest.approx(sum(rewards), abs=1e-12)
+        assert product.simulator.get_components() == tuple(te.get_state() for te in components)
+        assert product.is_failed() == any(te.is_failed() for te in components)
+        assert product.simulator.is_true() == all(te.simulator.is_true() for te in components)
+        n_true += product.simulator.is_true()
+
+        if product.is_failed() or rng.rand() < 0.05:
+            n_failures += product.is_failed()
+            product.reset()
+            for te in components:
+                te.reset()
+    assert n_failures > 0 and n_true > 0
+
+
+def test_on_the_fly_components_are_rejected():
+    with pytest.raises(ValueError):
+        ProductTemporalEvaluator([ChainEvaluator(), ChainEvaluator(on_the_fly=True)])
+
+    temporal_evaluators = [ChainEvaluator(formula=f, on_the_fly=True) for f in FORMULAS[:2]]
+    with pytest.raises(ValueError):
+        make_agent(temporal_evaluators, product_automaton=True)
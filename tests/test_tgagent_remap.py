@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the growth of the state spaces of the automata on the fly in `TGAgent`:
+the Q values must not depend on how many times the states have been remapped."""
+
+import itertools
+
+import numpy as np
+import pytest
+from gym.spaces import Discrete, Tuple
+
+from chain_world import ChainEnv, ChainEvaluator, LENGTH, make_agent, seed, train
+from rltg.agents.brains.TDBrain import QLearning
+from rltg.agents.brains.TDLambdaBrain import SarsaLambda
+from rltg.agents.brains.qtables.BoundedQTable import BoundedQTable
+from rltg.agents.brains.qtables.DenseQTable import DenseQTable
+from rltg.agents.brains.qtables.HashQTable import HashQTable
+from rltg.agents.brains.qtables.MemmapQTable import MemmapQTable
+from rltg.agents.brains.qtables.QTable import DictQTable
+from rltg.agents.brains.qtables.TileCodingQTable import TileCodingQTable
+
+N_AUTOMATA = 2
+LARGE_CAPACITY = 32
+
+
+def space(capacity):
+    return Tuple((Discrete(LENGTH),) + (Discrete(capacity),) * N_AUTOMATA)
+
+
+Q_TABLES = {
+    "dict":   lambda capacity, tmpdir: DictQTable(2),
+    "dense":  lambda capacity, tmpdir: DenseQTable(LENGTH * capacity ** N_AUTOMATA, 2),
+    "hash":   lambda capacity, tmpdir: HashQTable(2, capacity=4, dtype=np.float64),
+    "bounded": lambda capacity, tmpdir: BoundedQTable(2, 10000, dtype=np.float64),
+    "memmap": lambda capacity, tmpdir: MemmapQTable(LENGTH * capacity ** N_AUTOMATA, 2, directory=tmpdir,
+                                                    dtype=np.float64),
+    "tile":   lambda capacity, tmpdir: TileCodingQTable(space(capacity), 2, n_tilings=1, tile_width=1,
+                                                        one_hot=range(1, N_AUTOMATA + 1)),
+}
+
+BRAINS = {
+    "qlearning": lambda q_table: QLearning(None, ChainEnv.action_space, gamma=0.99, alpha=0.1, nsteps=5,
+                                           q_table=q_table),
+    "sarsa_lambda": lambda q_table: SarsaLambda(None, ChainEnv.action_space, gamma=0.99, alpha=0.1, lambd=0.8,
+                                                q_table=q_table),
+}
+
+
+def run(capacity, q_table, brain="qlearning", episodes=60):
+    """Train an agent whose automata on the fly start with the given capacity.
+    :returns the agent and the rewards."""
+    seed(0)
+    temporal_evaluators = [ChainEvaluator(on_the_fly=True) for _ in range(N_AUTOMATA)]
+    for te in temporal_evaluators:
+        te.simulator.capacity = capacity
+    agent = make_agent(temporal_evaluators, BRAINS[brain](q_table))
+    return agent, train(agent, episodes)
+
+
+def decoded_q_values(agent, n_discovered):
+    """:returns the Q values of every (robot features, discovered automata states) tuple."""
+    tuples = np.array(list(itertools.product(range(LENGTH), *[range(n) for n in n_discovered])))
+    return agent.brain.Q.get_rows(agent._from_tuple_to_int.encode_batch(tuples))
+
+
+@pytest.mark.parametrize("brain", sorted(BRAINS))
+@pytest.mark.parametrize("backend", sorted(Q_TABLES))
+def test_growing_capacity(tmpdir, backend, brain):
+    """Starting from capacity 1 the state spaces are remapped many times, from a large one never."""
+    growing, growing_rewards = run(1, Q_TABLES[backend](1, str(tmpdir.mkdir("growing"))), brain)
+    fixed, fixed_rewards = run(LARGE_CAPACITY, Q_TABLES[backend](LARGE_CAPACITY, str(tmpdir.mkdir("fixed"))), brain)
+
+    n_discovered = [len(te.simulator.states) for te in fixed.temporal_evaluators]
+    assert n_discovered == [len(te.simulator.states) for te in growing.temporal_evaluators]
+    assert all(te.simulator.capacity > 1 for te in growing.temporal_evaluators)
+    assert all(te.simulator.capacity == LARGE_CAPACITY for te in fixed.temporal_evaluators)
+    assert max(n_discovered) <= LARGE_CAPACITY
+
+    assert growing_rewards == fixed_rewards
+    assert np.array_equal(decoded_q_values(growing, n_discovered), decoded_q_values(fixed, n_discovered))
+    assert np.any(decoded_q_values(fixed, n_discovered) != 0.0)
+
+
+def test_tile_coding_rejects_tiled_automata():
+    """The automata states must be one-hot components of the tile coding, to be remapped."""
+    temporal_evaluators = [ChainEvaluator(on_the_fly=True) for _ in range(N_AUTOMATA)]
+    q_table = TileCodingQTable(space(8), 2, n_tilings=1, tile_width=1, one_hot=(1,))
+    with pytest.raises(ValueError):
+        make_agent(temporal_evaluators, QLearning(None, ChainEnv.action_space, q_table=q_table))
+
+    identity = lambda states: states
+    assert not q_table.can_remap([1, 2])
+    with pytest.raises(NotImplementedError):
+        q_table.remap(identity, space=Tuple((Discrete(LENGTH), Discrete(16), Discrete(16))))